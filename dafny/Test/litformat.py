@@ -0,0 +1,181 @@
+"""
+A lit test format that runs %diff commands in-process, with pydiff, and that
+can expand each test into one instance per variant of a configuration matrix.
+
+lit.site.cfg sets it up; it lives in its own module because lit pickles the
+test format (and the tests) to send them to its worker processes.
+"""
+import copy
+import inspect
+import io
+import os
+import re
+
+import lit.formats
+import lit.ShUtil
+import lit.Test
+import lit.TestRunner
+
+import pydiff
+
+class VariantTest(lit.Test.Test):
+    """
+    An instance of a test under one variant of the configuration matrix. Its
+    name starts with the variant's, and it runs in its own copy of the exec
+    tree, under execRoot/<variant>, so that variants don't share Output files.
+    """
+    def __init__(self, test, variant, config, execRoot):
+        super(VariantTest, self).__init__(test.suite, (variant,) + tuple(test.path_in_suite),
+                                          config, test.getSourcePath())
+        self.variant = variant
+        self.execRoot = execRoot
+
+    def getSourcePath(self):
+        return self.file_path
+
+    def getExecPath(self):
+        return os.path.join(self.execRoot, *self.path_in_suite)
+
+class InProcessDiffTest(lit.formats.ShTest):
+    """
+    Like ShTest, but runs %diff commands with pydiff inside lit instead of
+    starting a diff (or python) process for each of them. Other commands,
+    and %diff commands that are part of a pipeline or are redirected, go
+    through lit's shell as usual, with %diff expanded to external_diff.
+
+    If variants, a list of (name, substitutions) pairs, is not empty, each
+    test is run once per variant, with the variant's substitutions applied
+    before the configuration's, and with variantExecRoot as its exec root.
+    All instances are discovered together and share lit's worker pool.
+    """
+    # The program name that %diff expands to
+    PROGRAM = 'pydiff'
+    # What lit versions prepend to each RUN line to report its line number
+    LINE_MARKER = re.compile(r"^\s*(%dbg\([^)'\"]*\)|:\s*'[^']*';)\s*")
+    # Local configurations of each variant, by (id of the local configuration, variant)
+    VARIANT_CONFIGS = {}
+
+    def __init__(self, execute_external=False, external_diff=None, variants=(), variantExecRoot=None):
+        super(InProcessDiffTest, self).__init__(execute_external)
+        self.external_diff = external_diff
+        self.variants = list(variants)
+        self.variantExecRoot = variantExecRoot
+        # Otherwise this is a plain ShTest, and %diff must expand to external_diff
+        self.inProcess = not execute_external and InProcessDiffTest.litSupported()
+
+    @staticmethod
+    def litSupported():
+        """
+        Check that this lit has the (partly private) TestRunner functions that
+        execute relies on, with the signatures it expects.
+        """
+        try:
+            parameters = [inspect.signature(function).parameters for function in (
+                lit.TestRunner.parseIntegratedTestScript, lit.TestRunner.getDefaultSubstitutions,
+                lit.TestRunner.applySubstitutions, lit.TestRunner._runShTest, lit.TestRunner.buildPdbgCommand)]
+        except (AttributeError, TypeError, ValueError):
+            return False
+        return ('require_script' in parameters[0] and 'normalize_slashes' in parameters[1] and
+                'conditions' in parameters[2] and 'recursion_limit' in parameters[2] and
+                list(parameters[3]) == ['test', 'litConfig', 'useExternalSh', 'script', 'tmpBase'])
+
+    def variantConfig(self, config, variant, substitutions):
+        """
+        Return a copy of the local configuration config for variant.
+        """
+        key = (id(config), variant)
+        if key not in self.VARIANT_CONFIGS:
+            variantConfig = copy.copy(config)
+            variantConfig.substitutions = list(substitutions) + list(config.substitutions)
+            # Keep config alive so that its id isn't reused
+            self.VARIANT_CONFIGS[key] = (config, variantConfig)
+        return self.VARIANT_CONFIGS[key][1]
+
+    def expand(self, tests):
+        """
+        Yield the instances of tests under each variant, or tests unchanged if there are none.
+        """
+        for test in tests:
+            if not self.variants:
+                yield test
+                continue
+            for variant, substitutions in self.variants:
+                config = self.variantConfig(test.config, variant, substitutions)
+                yield VariantTest(test, variant, config, self.variantExecRoot or test.suite.exec_root)
+
+    def getTestsForPath(self, testSuite, path_in_suite, litConfig, localConfig):
+        return self.expand(super(InProcessDiffTest, self).getTestsForPath(
+            testSuite, path_in_suite, litConfig, localConfig))
+
+    def getTestsInDirectory(self, testSuite, path_in_suite, litConfig, localConfig):
+        tests = super(InProcessDiffTest, self).getTestsInDirectory(testSuite, path_in_suite, litConfig, localConfig)
+        # Newer lits discover the tests of a directory through getTestsForPath, which expands them already
+        if hasattr(lit.formats.ShTest, 'getTestsForPath'):
+            return tests
+        return self.expand(tests)
+
+    def inProcessArgs(self, command):
+        """
+        Return the arguments of command if it is a plain %diff command.
+        """
+        try:
+            parsed = lit.ShUtil.ShParser(self.LINE_MARKER.sub('', command), os.name == 'nt').parse()
+        except ValueError:
+            return None
+        if not isinstance(parsed, lit.ShUtil.Pipeline) or parsed.negate or len(parsed.commands) != 1:
+            return None
+        args = parsed.commands[0].args
+        if parsed.commands[0].redirects or args[0] != self.PROGRAM or not all(isinstance(arg, str) for arg in args):
+            return None
+        return args[1:]
+
+    def execute(self, test, litConfig):
+        if not self.inProcess:
+            return super(InProcessDiffTest, self).execute(test, litConfig)
+        if test.config.unsupported:
+            return lit.Test.Result(lit.Test.UNSUPPORTED, 'Test is unsupported')
+        script = [lit.TestRunner.buildPdbgCommand('preamble command line', command)
+                  for command in getattr(self, 'preamble_commands', [])]
+        parsed = lit.TestRunner.parseIntegratedTestScript(test, require_script=not script)
+        if isinstance(parsed, lit.Test.Result):
+            return parsed
+        script += parsed
+        if litConfig.noExecute:
+            return lit.Test.Result(lit.Test.PASS)
+
+        # Substitute exactly as lit.TestRunner.executeShTest does
+        tmpDir, tmpBase = lit.TestRunner.getTempPaths(test)
+        substitutions = list(getattr(self, 'extra_substitutions', []))
+        substitutions += lit.TestRunner.getDefaultSubstitutions(
+            test, tmpDir, tmpBase,
+            normalize_slashes=self.execute_external or litConfig.params.get('use_normalized_slashes', False))
+        conditions = {feature: True for feature in test.config.available_features}
+        script = lit.TestRunner.applySubstitutions(script, substitutions, conditions,
+                                                   recursion_limit=test.config.recursiveExpansionLimit)
+        try:
+            os.makedirs(os.path.dirname(tmpBase))
+        except OSError:
+            if not os.path.isdir(os.path.dirname(tmpBase)):
+                raise
+
+        output, batch = [], []
+        for command in script + [None]:
+            args = self.inProcessArgs(command) if command is not None else None
+            if command is not None and args is None:
+                batch.append(re.sub(r'(?<![\w./\\-])' + self.PROGRAM + r'(?![\w.-])', lambda _: self.external_diff, command))
+                continue
+            if batch:
+                result = lit.TestRunner._runShTest(test, litConfig, self.execute_external, batch, tmpBase)
+                output.append(result.output)
+                if result.code != lit.Test.PASS:
+                    return lit.Test.Result(result.code, '\n'.join(output))
+                batch = []
+            if command is not None:
+                out = io.StringIO()
+                # lit's shell runs commands in the directory of the test's exec path
+                exitCode = pydiff.diffCommand(args, out, os.path.dirname(test.getExecPath()))
+                output.append('$ {}\n{}'.format(self.LINE_MARKER.sub('', command), out.getvalue()))
+                if exitCode != 0:
+                    output.append('error: command failed with exit status: {}'.format(exitCode))
+                    return lit.Test.Result(lit.Test.FAIL, '\n'.join(output))
+        return lit.Test.Result(lit.Test.PASS, '\n'.join(output))
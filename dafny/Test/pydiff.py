@@ -5,22 +5,29 @@ tool. This exists to provide a simple ``diff`` like tool that will run on
 Windows where only the ``fc`` tool is available.
 """
 import argparse
+import bisect
 import difflib
+import io
 import os
+import stat
 import sys
 
+# Regions without unique common lines are handed to difflib, which is
+# quadratic, only if they are at most this large (in lines x lines)
+SMALL_REGION = 250000
 
-def main(args):
+
+def makeParser():
     parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
                                      description=__doc__
                                     )
-    # Open in binary mode so python doesn't try and do
-    # universal line endings for us.
+    # Files are opened in binary mode so python doesn't try and do
+    # universal line endings for us. '-' means standard input.
     parser.add_argument('from-file',
-                        type=argparse.FileType('rb'),
+                        type=str,
                        )
     parser.add_argument('to-file',
-                        type=argparse.FileType('rb'),
+                        type=str,
                        )
     parser.add_argument('-U','--unified=',
                         type=int,
@@ -36,33 +43,269 @@ def main(args):
                         action='store_true',
                         help='Ignore all whitespace characters when comparing'
                        )
+    return parser
+
+def parseArgs(args):
+    """
+    Parse diff command line arguments. Raises SystemExit on bad arguments,
+    like argparse.
+    """
+    return makeParser().parse_args(args)
+
+def openFile(path, cwd=None):
+    if path == '-':
+        return getattr(sys.stdin, 'buffer', sys.stdin)
+    return open(os.path.join(cwd, path) if cwd else path, 'rb')
 
-    parsedArgs = parser.parse_args(args)
-    fromFile, fromFileName = preProcess(getattr(parsedArgs,'from-file'),
-                                        parsedArgs.strip_trailing_cr,
-                                        parsedArgs.ignore_all_space
-                                       )
-    toFile, toFileName = preProcess(getattr(parsedArgs,'to-file'),
-                                    parsedArgs.strip_trailing_cr,
-                                    parsedArgs.ignore_all_space
-                                   )
-
-    result = difflib.unified_diff(fromFile,
-                                  toFile,
-                                  fromFileName,
-                                  toFileName,
-                                  n=getattr(parsedArgs,'unified='),
-                                 )
-    # Force lazy computation to happen now
-    result = list(result)
-
-    if len(result) == 0:
-        # Files are identical
+def diff(fromFile, toFile, unified=3, stripTrailingCR=False, ignoreAllSpace=False, out=None):
+    """
+    Compare two files opened in binary mode and write a unified diff of
+    them to out (standard output by default). Returns 0 if they are the same
+    and 1 if they differ, like diff.
+    """
+    out = out or sys.stdout
+    if filesIdentical(fromFile, toFile):
         return 0
-    else:
-        for l in result:
-            sys.stdout.write(l)
-        return 1
+
+    fromLines, fromFileName = preProcess(fromFile, stripTrailingCR, ignoreAllSpace)
+    toLines, toFileName = preProcess(toFile, stripTrailingCR, ignoreAllSpace)
+
+    different = False
+    for l in unifiedDiff(fromLines, toLines, fromFileName, toFileName, n=unified):
+        out.write(l)
+        different = True
+    return 1 if different else 0
+
+def diffCommand(args, out=None, cwd=None):
+    """
+    Run a diff command line (without the program name) in-process, with
+    paths relative to cwd. Returns the exit code that pydiff.py would have
+    returned: 0 if the files are the same, 1 if they differ, 2 on errors.
+    """
+    try:
+        parsedArgs = parseArgs(args)
+    except SystemExit as e:
+        return e.code
+    try:
+        fromFile = openFile(getattr(parsedArgs,'from-file'), cwd)
+        toFile = openFile(getattr(parsedArgs,'to-file'), cwd)
+    except IOError as e:
+        sys.stderr.write('pydiff: {}\n'.format(e))
+        return 2
+    with fromFile, toFile:
+        return diff(fromFile,
+                    toFile,
+                    unified=getattr(parsedArgs,'unified='),
+                    stripTrailingCR=parsedArgs.strip_trailing_cr,
+                    ignoreAllSpace=parsedArgs.ignore_all_space,
+                    out=out,
+                   )
+
+def main(args):
+    return diffCommand(args)
+
+def filesIdentical(fromFile, toFile, chunkSize=2**20):
+    """
+    Check whether two open binary files have exactly the same contents,
+    without decoding them. Only regular files of equal sizes are read; both
+    files are rewound afterwards.
+    """
+    try:
+        fromStat = os.fstat(fromFile.fileno())
+        toStat = os.fstat(toFile.fileno())
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return False
+    if not (stat.S_ISREG(fromStat.st_mode) and stat.S_ISREG(toStat.st_mode)):
+        return False
+    if fromStat.st_size != toStat.st_size:
+        return False
+
+    try:
+        return chunksIdentical(iter(lambda: fromFile.read(chunkSize), b''),
+                               iter(lambda: toFile.read(chunkSize), b''))
+    finally:
+        fromFile.seek(0)
+        toFile.seek(0)
+
+def chunksIdentical(fromChunks, toChunks):
+    """
+    Check whether two iterables of byte strings have the same concatenation,
+    consuming them only up to the first difference. This is the comparison
+    that decides whether outputs match, here and in runTests.py.
+    """
+    fromChunks, toChunks = iter(fromChunks), iter(toChunks)
+    fromChunk, toChunk = b'', b''
+    while True:
+        while fromChunk == b'':
+            fromChunk = next(fromChunks, None)
+        while toChunk == b'':
+            toChunk = next(toChunks, None)
+        if fromChunk is None or toChunk is None:
+            return fromChunk is toChunk
+        size = min(len(fromChunk), len(toChunk))
+        if fromChunk[:size] != toChunk[:size]:
+            return False
+        fromChunk, toChunk = fromChunk[size:], toChunk[size:]
+
+def uniqueCommonLines(a, b, alo, ahi, blo, bhi):
+    """
+    Return the longest sequence of (i, j) pairs, increasing in both i and j,
+    such that a[i] == b[j] occurs exactly once in a[alo:ahi] and in
+    b[blo:bhi].
+    """
+    counts = {}
+    for i in range(alo, ahi):
+        entry = counts.setdefault(a[i], [0, 0, i, None])
+        entry[0] += 1
+    for j in range(blo, bhi):
+        entry = counts.get(b[j])
+        if entry is not None:
+            entry[1] += 1
+            entry[3] = j
+    pairs = sorted((i, j) for (countA, countB, i, j) in counts.values() if countA == 1 and countB == 1)
+
+    # Patience sorting: longest increasing subsequence of the j's
+    tops, topPairs, previous = [], [], {}
+    for pair in pairs:
+        pile = bisect.bisect_left(tops, pair[1])
+        if pile == len(tops):
+            tops.append(pair[1])
+            topPairs.append(pair)
+        else:
+            tops[pile] = pair[1]
+            topPairs[pile] = pair
+        previous[pair] = topPairs[pile - 1] if pile > 0 else None
+
+    result = []
+    pair = topPairs[-1] if topPairs else None
+    while pair is not None:
+        result.append(pair)
+        pair = previous[pair]
+    result.reverse()
+    return result
+
+def patienceMatches(a, b, alo, ahi, blo, bhi, matches):
+    """
+    Append to matches the (i, j) pairs of lines matched between a[alo:ahi]
+    and b[blo:bhi] by a patience diff: common prefixes and suffixes match,
+    and so do lines that are unique on both sides, in order; the regions
+    between those are then matched recursively.
+    """
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        matches.append((alo, blo))
+        alo += 1
+        blo += 1
+    tail = []
+    while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+        ahi -= 1
+        bhi -= 1
+        tail.append((ahi, bhi))
+
+    if alo < ahi and blo < bhi:
+        anchors = uniqueCommonLines(a, b, alo, ahi, blo, bhi)
+        if anchors:
+            for (i, j) in anchors:
+                patienceMatches(a, b, alo, i, blo, j, matches)
+                matches.append((i, j))
+                alo, blo = i + 1, j + 1
+            patienceMatches(a, b, alo, ahi, blo, bhi, matches)
+        elif (ahi - alo) * (bhi - blo) <= SMALL_REGION:
+            matcher = difflib.SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=False)
+            for (i, j, size) in matcher.get_matching_blocks():
+                matches.extend((alo + i + k, blo + j + k) for k in range(size))
+
+    tail.reverse()
+    matches.extend(tail)
+
+def getOpcodes(a, b):
+    """
+    Return the opcodes of a patience diff of a and b, in the format of
+    difflib.SequenceMatcher.get_opcodes().
+    """
+    matches = []
+    patienceMatches(a, b, 0, len(a), 0, len(b), matches)
+    matches.append((len(a), len(b)))
+
+    opcodes = []
+    i = j = 0
+    for (mi, mj) in matches:
+        if i < mi and j < mj:
+            opcodes.append(('replace', i, mi, j, mj))
+        elif i < mi:
+            opcodes.append(('delete', i, mi, j, j))
+        elif j < mj:
+            opcodes.append(('insert', i, i, j, mj))
+        if mi < len(a) and mj < len(b):
+            if opcodes and opcodes[-1][0] == 'equal':
+                tag, i1, i2, j1, j2 = opcodes[-1]
+                opcodes[-1] = (tag, i1, mi + 1, j1, mj + 1)
+            else:
+                opcodes.append(('equal', mi, mi + 1, mj, mj + 1))
+        i, j = mi + 1, mj + 1
+    return opcodes or [('equal', 0, 0, 0, 0)]
+
+def groupOpcodes(opcodes, n):
+    """
+    Split opcodes into hunks with up to n lines of context, like
+    difflib.SequenceMatcher.get_grouped_opcodes().
+    """
+    codes = list(opcodes)
+    if codes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == 'equal' and i2 - i1 > 2 * n:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+def formatRange(start, stop):
+    """
+    Format a hunk's line range the way unified diffs do.
+    """
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return '{}'.format(beginning)
+    if not length:
+        beginning -= 1
+    return '{},{}'.format(beginning, length)
+
+def unifiedDiff(a, b, fromFileName, toFileName, n=3):
+    """
+    Same output as difflib.unified_diff, but computed with a patience diff,
+    which stays close to linear on large files that differ in a few places.
+    """
+    started = False
+    for group in groupOpcodes(getOpcodes(a, b), n):
+        if not started:
+            started = True
+            yield '--- {}\n'.format(fromFileName)
+            yield '+++ {}\n'.format(toFileName)
+
+        first, last = group[0], group[-1]
+        yield '@@ -{} +{} @@\n'.format(formatRange(first[1], last[2]), formatRange(first[3], last[4]))
+
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for line in a[i1:i2]:
+                    yield ' ' + line
+                continue
+            if tag in ('replace', 'delete'):
+                for line in a[i1:i2]:
+                    yield '-' + line
+            if tag in ('replace', 'insert'):
+                for line in b[j1:j2]:
+                    yield '+' + line
 
 def preProcess(openFile, stripTrailingCR=False, ignoreAllSpace=False):
     """
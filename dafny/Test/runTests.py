@@ -3,16 +3,39 @@ import os
 import re
 import sys
 import csv
+import copy
+import html
+import gzip
+import io
+import json
+import queue
+import base64
+import hashlib
 import shutil
+import socket
+import sqlite3
+import signal
+import asyncio
 import argparse
+import threading
+import subprocess
+import heapq
+import random
 import operator
 import platform
-from math import floor, ceil
+import socketserver
+from glob import glob
+from math import floor, ceil, sqrt, log, exp, erfc
+from statistics import median
 from enum import Enum
 from time import time, strftime
-from collections import defaultdict
+from collections import defaultdict, deque
+import multiprocessing
 from multiprocessing import Pool, Manager
-from subprocess import Popen, call, PIPE, TimeoutExpired
+from subprocess import Popen, call, check_output, PIPE, DEVNULL, TimeoutExpired, CalledProcessError
+from concurrent.futures import ThreadPoolExecutor
+
+import pydiff
 
 # C:/Python34/python.exe runTests.py --compiler "c:/MSR/dafny/Binaries/Dafny.exe" --flags "/useBaseNameForFileName /compile:1 /nologo" --difftool "C:\Program Files (x86)\Meld\Meld.exe" -j4 --flags "/dprelude preludes\AlmostAllTriggers.bpl" dafny0\SeqFromArray.dfy
 
@@ -21,6 +44,11 @@ from subprocess import Popen, call, PIPE, TimeoutExpired
 VERBOSITY = None
 KILLED = False
 ANSI = False
+SERVER = None
+PROCESSES = set()
+EVENTS = None
+EVENTS_FD = None
+WORKER_SLOT = None
 
 try:
     import colorama
@@ -35,6 +63,11 @@ except ImportError:
     except ImportError:
         pass
 
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
 class Defaults:
     EXCLUDED_FILES = ["^flycheck_"]
     EXCLUDED_FOLDERS = ["Inputs", "Output", "sandbox", "desktop"]
@@ -42,6 +75,26 @@ class Defaults:
     COMPILER = [DAFNY_BIN]
     FLAGS = ["/useBaseNameForFileName", "/compile:1", "/nologo", "/timeLimit:300"]
     EXTENSIONS = [".dfy", ".transcript"]
+    SERVER_MAX_REQUESTS = 100
+    SERVER_MAX_MEMORY = 2048
+    COMPILER_EXTENSIONS = [".exe", ".dll", ".bpl"]
+    COMPILER_SOURCES = "../Source"
+    DURATION = 10.0
+    ALPHA = 0.05
+    BOOTSTRAP_RESAMPLES = 2000
+    MANN_WHITNEY_EXACT = 40
+    ENGINE = "pool"
+    MAX_OUTPUT = 64 * 2**20
+    MAX_STDERR = 2**16
+    DISCOVERY_INDEX = "discovery-index.json"
+    DISCOVERY_THREADS = 16
+    BLOBS = "blobs"
+    DASHBOARD_ROWS = 25
+    TRIAGE_REPORT = "triage.html"
+    NORMALIZE_FILE = "normalize.json"
+    TIMEOUT_FLOOR = 30.0
+    ADAPTIVE_TIMEOUT_PERCENTILE = 95
+    ADAPTIVE_TIMEOUT_MIN_SAMPLES = 3
 
 class Colors:
     RED = '\033[91m'
@@ -96,14 +149,199 @@ class TestStatus(Enum):
     FAILED  = (2, Colors.RED)
     UNKNOWN = (3, Colors.RED)
     TIMEOUT = (4, Colors.RED)
+    OVERSIZED = (5, Colors.RED)
 
     def __init__(self, index, color):
         self.index = index
         self.color = color
         self.elide = False
 
+class CappedStream:
+    """A writable stream that keeps at most `limit` bytes, and counts the rest."""
+
+    def __init__(self, limit, target=None):
+        self.limit = limit
+        self.target = target
+        self.size, self.dropped = 0, 0
+        self.lock = threading.Lock()
+
+    def open(self, path, truncate):
+        self.close()
+        with self.lock:
+            self.target = open(path, mode='wb' if truncate else 'ab')
+            self.size = self.target.tell()
+
+    def close(self):
+        with self.lock:
+            if self.target is not None and not isinstance(self.target, io.BytesIO):
+                self.target.close()
+                self.target = None
+
+    def write(self, chunk):
+        with self.lock:
+            kept = max(0, min(len(chunk), self.limit - self.size))
+            if kept and self.target is not None:
+                self.target.write(chunk[:kept])
+            self.size += kept
+            self.dropped += len(chunk) - kept
+
+    @staticmethod
+    def pump(stream, sink):
+        for chunk in iter(lambda: stream.read1(2**16), b''):
+            sink.write(chunk)
+
+    @staticmethod
+    async def pump_async(stream, sink):
+        while True:
+            chunk = await stream.read(2**16)
+            if not chunk:
+                break
+            sink.write(chunk)
+
+class Normalizer:
+    """Rules that normalize the outputs of the tests in a directory before they are compared.
+
+    Rules come from the normalize.json files of the directory and its parents, outermost
+    first.  Such a file holds a JSON object with an optional list of "rules",
+    each replacing the matches of a regular expression ("pattern") in a line
+    with "replace", and an optional "sort_blocks" regular expression: runs of
+    consecutive blocks, each made of a line matching it and the indented
+    lines that follow, are sorted, so that independent errors may be reported
+    in any order.  The innermost "sort_blocks" applies.
+
+    A "compare" setting of "diagnostics" (instead of the default "text")
+    compares verifier diagnostics as a multiset, for tests whose errors come
+    out in a nondeterministic order (e.g. with /vcsCores:N): each
+    "file(line,col): Error" or "Warning" line, along with its execution trace
+    and related locations, is moved to the end of the output, in sorted
+    order; other lines, including the "verifier finished" summary, stay in
+    place.  A "tests" object maps file names in the directory to settings
+    that apply on top of the directory's, for individual tests.
+
+    Normalizers are built (and their expressions compiled) once per directory
+    and process; they are applied line by line to streams of chunks whose
+    line endings are already normalized."""
+
+    CACHE = {}
+    COMPARE_MODES = ["text", "diagnostics"]
+    DIAGNOSTIC = re.compile(rb"^\S.*\(\d+,\d+\): (Error|Warning)\b")
+    CONTINUATION = re.compile(rb"^(\s+\S|Execution trace:|\S.*\(\d+,\d+\): Related location\b)")
+
+    def __init__(self, directory, rules=(), sort_blocks=None, compare="text", tests=None, fname=None):
+        if compare not in Normalizer.COMPARE_MODES:
+            raise ValueError("Unknown comparison mode '{}'".format(compare))
+        self.directory, self.fname, self.tests = directory, fname, tests or {}
+        self.rule_specs, self.sort_blocks_spec, self.compare = list(rules), sort_blocks, compare
+        self.rules = [(re.compile(pattern.encode("utf-8")), replace.encode("utf-8")) for pattern, replace in self.rule_specs]
+        self.sort_blocks = re.compile(sort_blocks.encode("utf-8")) if sort_blocks else None
+        self.digest = hashlib.sha256(json.dumps([self.rule_specs, sort_blocks, compare]).encode("utf-8")).hexdigest()
+
+    def __reduce__(self):
+        # Workers rebuild normalizers from their own cache instead of recompiling one per test
+        return (Normalizer.for_test, (self.directory, self.fname))
+
+    def extend(self, config, directory, fname=None):
+        """Apply the settings in `config` (the object of a normalize.json file) on top of this normalizer's."""
+        rules = [(rule["pattern"], rule["replace"]) for rule in config.get("rules", [])]
+        return Normalizer(directory, self.rule_specs + rules, config.get("sort_blocks", self.sort_blocks_spec),
+                          config.get("compare", self.compare), config.get("tests") if fname is None else None, fname)
+
+    @staticmethod
+    def for_directory(directory):
+        directory = os.path.realpath(directory)
+        if directory not in Normalizer.CACHE:
+            parent = os.path.dirname(directory)
+            inherited = Normalizer.for_directory(parent) if parent != directory else Normalizer(directory)
+            normalizer = inherited.extend({}, directory)
+            path = os.path.join(directory, Defaults.NORMALIZE_FILE)
+            if os.path.exists(path):
+                try:
+                    with open(path) as reader:
+                        normalizer = inherited.extend(json.load(reader), directory)
+                except (OSError, ValueError, KeyError, TypeError, AttributeError, re.error) as e:
+                    debug(Debug.ERROR, "Ignoring {}: {}".format(path, e))
+            Normalizer.CACHE[directory] = normalizer
+        return Normalizer.CACHE[directory]
+
+    @staticmethod
+    def for_test(directory, fname=None):
+        normalizer = Normalizer.for_directory(directory)
+        if fname not in normalizer.tests:
+            return normalizer
+        key = (normalizer.directory, fname)
+        if key not in Normalizer.CACHE:
+            try:
+                Normalizer.CACHE[key] = normalizer.extend(normalizer.tests[fname], normalizer.directory, fname)
+            except (ValueError, KeyError, TypeError, AttributeError, re.error) as e:
+                debug(Debug.ERROR, "Ignoring the settings of {} in {}: {}".format(
+                    fname, os.path.join(normalizer.directory, Defaults.NORMALIZE_FILE), e))
+                Normalizer.CACHE[key] = normalizer
+        return Normalizer.CACHE[key]
+
+    @staticmethod
+    def lines(chunks):
+        pending = b''
+        for chunk in chunks:
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                yield line + b'\n'
+        if pending:
+            yield pending
+
+    def rewrite(self, line):
+        content, newline = (line[:-1], b'\n') if line.endswith(b'\n') else (line, b'')
+        for pattern, replace in self.rules:
+            content = pattern.sub(replace, content)
+        return content + newline
+
+    def sort_runs(self, lines):
+        blocks = []
+        for line in lines:
+            if self.sort_blocks.match(line):
+                blocks.append([line])
+                continue
+            if blocks and line[:1] in (b' ', b'\t'):
+                blocks[-1].append(line)
+                continue
+            for block in sorted(blocks):
+                yield from block
+            blocks = []
+            yield line
+        for block in sorted(blocks):
+            yield from block
+
+    @staticmethod
+    def sort_diagnostics(lines):
+        blocks, block = [], None
+        for line in lines:
+            if Normalizer.DIAGNOSTIC.match(line):
+                block = [line]
+                blocks.append(block)
+            elif block is not None and Normalizer.CONTINUATION.match(line):
+                block.append(line)
+            else:
+                block = None
+                yield line
+        for block in sorted(blocks):
+            yield from block
+
+    def normalize(self, chunks):
+        """Yield the normalized contents of `chunks`, in a single pass."""
+        if not self.rules and not self.sort_blocks and self.compare == "text":
+            yield from chunks
+            return
+        lines = (self.rewrite(line) for line in Normalizer.lines(chunks))
+        if self.sort_blocks:
+            lines = self.sort_runs(lines)
+        if self.compare == "diagnostics":
+            lines = Normalizer.sort_diagnostics(lines)
+        yield from lines
+
 class Test:
-    COLUMNS = ["name", "status", "start", "end", "duration", "returncodes", "suite_time", "njobs", "proc_info", "source_path", "temp_directory", "cmds", "expected", "output"]
+    RUSAGE_COLUMNS = ["user_time", "system_time", "max_rss", "block_input", "block_output", "voluntary_switches", "involuntary_switches"]
+    METRICS = ["duration", "cpu_time"] + RUSAGE_COLUMNS
+    COLUMNS = ["name", "status", "start", "end", "duration", "returncodes"] + RUSAGE_COLUMNS + ["suite_time", "njobs", "proc_info", "source_path", "temp_directory", "cmds", "cached", "dropped_bytes", "timeout", "retried", "samples", "duration_mad", "duration_min", "expected_digest", "output_digest"]
 
     def __init__(self, name, source_path, cmds, timeout, compiler_id = 0):
         self.name = name
@@ -113,23 +351,37 @@ class Test:
         self.temp_directory = os.path.join(self.source_directory, "Output")
         self.temp_output_path = os.path.join(self.temp_directory, self.fname + ".tmp")
 
-        self.output = None
+        self.normalizer = Normalizer.for_test(self.source_directory, self.fname)
         self.expected = Test.read_normalize(self.expect_path)
+        if self.expected:
+            self.expected = b"".join(self.normalizer.normalize([self.expected]))
 
         self.cmds = cmds
         self.timeout = timeout
+        self.retried = False
+        self.slot = None
         self.compiler_id = compiler_id
         self.cmds = [cmd.replace("%s", self.source_path) for cmd in self.cmds]
         self.cmds = [cmd.replace("%S", self.source_directory) for cmd in self.cmds]
         self.cmds = [cmd.replace("%t", self.temp_output_path) for cmd in self.cmds]
         self.cmds = [cmd.replace("%T", self.temp_directory) for cmd in self.cmds]
 
-        self.status = TestStatus.PENDING
         self.proc_info = platform.processor()
 
-        self.time, self.suite_time = None, None
-        self.njobs, self.returncodes = None, []
+        self.time, self.suite_time, self.njobs = None, None, None
+        self.compiler_digest, self.cache_key = None, None
+        self.max_output = Defaults.MAX_OUTPUT
+        self.reset()
+
+    def reset(self):
+        """Forget the results of any previous run, so that the test can be run again."""
+        self.status, self.output = TestStatus.PENDING, None
+        self.returncodes = []
         self.start, self.end, self.duration = None, None, None
+        self.cached, self.dropped_bytes = False, 0
+        self.process_groups = []
+        for col in Test.RUSAGE_COLUMNS:
+            setattr(self, col, None)
 
     @staticmethod
     def source_to_expect_path(source):
@@ -148,6 +400,24 @@ class Test:
             debug(Debug.WARNING, "{} not found".format(path))
             return ""
 
+    @staticmethod
+    def read_normalize_chunks(path, chunk_size=2**16):
+        """Like `read_normalize`, but yields the contents of `path` in chunks."""
+        try:
+            with open(path, mode="rb") as reader:
+                pending_cr = False
+                for chunk in iter(lambda: reader.read(chunk_size), b''):
+                    if pending_cr:
+                        chunk = b'\r' + chunk
+                    pending_cr = chunk.endswith(b'\r')
+                    if pending_cr:
+                        chunk = chunk[:-1]
+                    yield chunk.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+                if pending_cr:
+                    yield b'\n'
+        except FileNotFoundError:
+            pass
+
     @staticmethod
     def build_report(tests, name):
         now = strftime("%Y-%m-%d-%H-%M-%S")
@@ -157,20 +427,44 @@ class Test:
         else:
             name = now
 
+        store = BlobStore(os.path.join(os.path.dirname(name), Defaults.BLOBS))
+        os.makedirs(os.path.dirname(name) or ".", exist_ok=True)
         with open(name + ".csv", mode='w', newline='') as writer:
             csv_writer = csv.DictWriter(writer, Test.COLUMNS, dialect='excel')
             csv_writer.writeheader()
             for test in tests:
+                test.store_blobs(store)
                 test.serialize(csv_writer)
 
     @staticmethod
     def load_report(path):
         results = []
+        csv.field_size_limit(2**31 - 1) # Older reports inline outputs of up to --max-output bytes
+        blobs = os.path.join(os.path.dirname(path), Defaults.BLOBS)
         with open(path) as csvfile:
             for row in csv.DictReader(csvfile):  #, fieldnames=Test.COLUMNS):
-                results.append(Test.deserialize(row))
+                test = Test.deserialize(row)
+                test.blobs = blobs
+                results.append(test)
         return results
 
+    def store_blobs(self, store):
+        """Fill in expected_digest and output_digest, saving the corresponding blobs.
+
+        The output is only saved when it differs from the expected output.
+        Tests loaded from another report have no outputs in memory; their
+        blobs are copied over from that report's blob directory instead.
+        """
+        expected, output = getattr(self, "expected", None), getattr(self, "output", None)
+        if isinstance(expected, (bytes, str)):
+            self.expected_digest = store.put(expected if isinstance(expected, bytes) else expected.encode("utf-8"))
+            self.output_digest = store.put(output) if isinstance(output, bytes) else None
+            return
+        source = getattr(self, "blobs", None)
+        for digest in (getattr(self, "expected_digest", None), getattr(self, "output_digest", None)):
+            if digest and source:
+                store.copy(BlobStore(source), digest)
+
     @staticmethod
     def mean_duration(results, margin):
         durations = sorted(result.duration for result in results
@@ -206,6 +500,10 @@ class Test:
                         for test in tests:
                             debug(Debug.REPORT, "* " + test.name, headers=status, silentheaders=True)
 
+            cached = sum(1 for t in results if t.cached)
+            if cached:
+                debug(Debug.REPORT, "{} of {} result(s) restored from cache".format(cached, len(results)))
+
             debug(Debug.REPORT)
 
             failing = [t for t in results if t.status != TestStatus.PASSED]
@@ -219,53 +517,261 @@ class Test:
                 results[0].suite_time, results[0].njobs, Test.mean_duration(results, 1.5)))
 
 
-    def run(self):
+    def setup(self, cache):
         debug(Debug.DEBUG, "Starting {}".format(self.name))
+        self.reset()
         os.makedirs(self.temp_directory, exist_ok=True)
         # os.chdir(self.source_directory)
 
-        stdout, stderr = b'', b''
+        if cache is not None and cache.restore(self):
+            return False
+
         self.start = time()
+        self.emit("started", slot=self.slot, pid=os.getpid(), timeout=self.timeout)
+        return True
+
+    def emit(self, event, **fields):
+        emit(event, test=self.name, compiler_id=self.compiler_id, **fields)
+
+    def command_finished(self, index, started):
+        returncode = self.returncodes[index] if index < len(self.returncodes) else None
+        self.emit("command_finished", index=index, returncode=returncode, duration=time() - started)
+
+    def timed_out(self, output):
+        self.status = TestStatus.TIMEOUT
+        self.end = self.start + self.timeout
+        self.duration = self.timeout
+        self.check_output_size(output)
+
+    def check_output_size(self, output):
+        output.close()
+        self.dropped_bytes = output.dropped
+        if output.dropped:
+            debug(Debug.WARNING, "Output of {} exceeded {} bytes; dropped {} byte(s)".format(
+                self.name, output.limit, output.dropped))
+            self.status = TestStatus.OVERSIZED
+        return not output.dropped
+
+    def finish(self, output, errors, cache):
+        self.end = time()
+        self.duration = self.end - self.start
+
+        stderr = errors.target.getvalue().strip()
+        if stderr != b"":
+            debug(Debug.INFO, stderr.decode("utf-8", errors="replace"))
+
+        if self.check_output_size(output):
+            self.update_status()
+            if cache is not None:
+                cache.store(self)
+
+    @staticmethod
+    def wait(proc, timeout):
+        """Wait for `proc` to complete and return its resource usage.
+
+        The usage reported by wait4 includes that of all descendants that were
+        waited for, so it covers Dafny and Z3, not just the shell that runs
+        them.  Returns None where wait4 isn't available."""
+        if not hasattr(os, "wait4"):
+            proc.wait(timeout=timeout)
+            return None
+
+        status = []
+        def wait4():
+            try:
+                status.append(os.wait4(proc.pid, 0))
+            except ChildProcessError:
+                pass
+        waiter = threading.Thread(target=wait4, daemon=True)
+        waiter.start()
+        waiter.join(timeout)
+        if not status:
+            raise TimeoutExpired(proc.args, timeout)
+
+        _, exit_status, rusage = status[0]
+        if os.WIFSIGNALED(exit_status):
+            proc.returncode = -os.WTERMSIG(exit_status)
+        else:
+            proc.returncode = os.WEXITSTATUS(exit_status)
+        return rusage
+
+    def record_rusage(self, rusage):
+        if rusage is None:
+            return
+        # ru_maxrss is in kilobytes, except on macOS where it's in bytes
+        max_rss = rusage.ru_maxrss / (2**20 if sys.platform == "darwin" else 2**10)
+        self.max_rss = max(self.max_rss or 0, max_rss)
+        for col, value in (("user_time", rusage.ru_utime), ("system_time", rusage.ru_stime),
+                           ("block_input", rusage.ru_inblock), ("block_output", rusage.ru_oublock),
+                           ("voluntary_switches", rusage.ru_nvcsw), ("involuntary_switches", rusage.ru_nivcsw)):
+            setattr(self, col, (getattr(self, col) or 0) + value)
+
+    @property
+    def cpu_time(self):
+        if self.user_time is None or self.system_time is None:
+            return None
+        return self.user_time + self.system_time
+
+    def metric(self, metric):
+        return getattr(self, metric)
+
+    def metric_samples(self, metric):
+        """All measurements of `metric`: one per repetition under --repeat, else just the one."""
+        samples = getattr(self, "samples", None)
+        if samples and metric in samples:
+            return [value for value in samples[metric] if value is not None]
+        value = self.metric(metric)
+        return [value] if value is not None else []
+
+    @staticmethod
+    def aggregate(runs):
+        """Combine repeated runs of a test into a single result.
+
+        The status is the first non-PASSED status, if any.  Each metric is the
+        median of its samples; the samples themselves are kept, along with the
+        median absolute deviation and minimum of the durations."""
+        test = next((t for t in runs if t.status != TestStatus.PASSED), runs[-1])
+        test.samples = {metric: [t.metric(metric) for t in runs] for metric in Test.METRICS}
+        for metric in ["duration"] + Test.RUSAGE_COLUMNS:
+            values = [value for value in test.samples[metric] if value is not None]
+            setattr(test, metric, median(values) if values else None)
+        durations = [d for d in test.samples["duration"] if d is not None]
+        test.duration_mad = median(abs(d - test.duration) for d in durations) if durations else None
+        test.duration_min = min(durations) if durations else None
+        test.start = min(t.start for t in runs)
+        test.end = max(t.end for t in runs)
+        return test
+
+    def split_redirect(self, cmd):
+        """Split a trailing '> "%t"' (or '>> "%t"') off `cmd`.
+
+        The runner writes the output itself, so that it can enforce
+        `max_output`.  Returns the command and whether the output file should
+        be truncated first."""
+        # Only stdout redirections: '2> "%t"' and '&> "%t"' are left to the shell
+        match = re.match(r'^(.*?)\s*(?<![0-9&>])(>>?)\s*"?' + re.escape(self.temp_output_path) + r'"?\s*$', cmd)
+        if match:
+            return match.group(1), match.group(2) == ">"
+        return cmd, False
+
+    def run(self, server=None, cache=None):
+        if not self.setup(cache):
+            return
+
+        output = CappedStream(self.max_output)
+        errors = CappedStream(Defaults.MAX_STDERR, io.BytesIO())
 
         try:
-            for cmd in self.cmds:
+            for index, cmd in enumerate(self.cmds):
                 debug(Debug.DEBUG, "> {}".format(cmd))
+                self.emit("command_started", index=index, cmd=cmd)
+                proc, started = None, time()
                 try:
-                    proc = Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE, shell=True)
-                    _stdout, _stderr = proc.communicate(timeout=self.timeout)
-                    stdout, stderr = stdout + _stdout, stderr + _stderr
+                    if server is not None:
+                        returncode = server.verify(cmd, self.timeout)
+                        if returncode is not None:
+                            self.returncodes.append(returncode)
+                            continue
+                    cmd, truncate = self.split_redirect(cmd)
+                    output.open(self.temp_output_path, truncate)
+                    proc = spawn(cmd)
+                    self.process_groups.append(proc.pid)
+                    proc.stdin.close()
+                    pumps = [threading.Thread(target=CappedStream.pump, args=(proc.stdout, output), daemon=True),
+                             threading.Thread(target=CappedStream.pump, args=(proc.stderr, errors), daemon=True)]
+                    for pump in pumps:
+                        pump.start()
+                    self.record_rusage(Test.wait(proc, self.timeout))
+                    # Processes left behind by the command may still hold its output pipes open
+                    for pump in pumps:
+                        pump.join(max(0, self.start + self.timeout - time()))
+                    if any(pump.is_alive() for pump in pumps):
+                        debug(Debug.WARNING, "Killing processes left running by {}".format(self.name))
+                        kill_process_tree(proc)
+                        for pump in pumps:
+                            pump.join()
                     self.returncodes.append(proc.returncode)
                 except FileNotFoundError:
                     debug(Debug.ERROR, "Program '{}' not found".format(cmd))
                     self.status = TestStatus.UNKNOWN
                     return
                 except TimeoutExpired:
-                    self.status = TestStatus.TIMEOUT
-                    self.end = self.start + self.timeout
-                    self.duration = self.timeout
-                    proc.kill()
+                    if proc is not None:
+                        kill_process_tree(proc)
+                    self.timed_out(output)
                     return
-
-            self.end = time()
-            self.duration = self.end - self.start
-
-            stdout, stderr = stdout.strip(), stderr.strip()
-            if stdout != b"":
-                debug(Debug.TRACE, "Writing the output of {} to {}".format(self.name, self.temp_output_path))
-                with open(self.temp_output_path, mode='ab') as writer:
-                    writer.write(stdout)
-            if stderr != b"":
-                debug(Debug.INFO, stderr.decode("utf-8"))
-
-            self.update_status()
+                except KeyboardInterrupt:
+                    if proc is not None:
+                        kill_process_tree(proc)
+                    raise
+                finally:
+                    if proc is not None:
+                        PROCESSES.discard(proc)
+                    self.command_finished(index, started)
+
+            self.finish(output, errors, cache)
         except TimeoutExpired:
             self.status = TestStatus.TIMEOUT
         except KeyboardInterrupt:
             raise
+        finally:
+            output.close()
+
+    async def run_async(self, cache=None):
+        """Same as `run`, but drives the commands from an asyncio event loop."""
+        if not self.setup(cache):
+            return
+
+        output = CappedStream(self.max_output)
+        errors = CappedStream(Defaults.MAX_STDERR, io.BytesIO())
+
+        try:
+            for index, cmd in enumerate(self.cmds):
+                debug(Debug.DEBUG, "> {}".format(cmd))
+                self.emit("command_started", index=index, cmd=cmd)
+                started = time()
+                try:
+                    cmd, truncate = self.split_redirect(cmd)
+                    output.open(self.temp_output_path, truncate)
+                    try:
+                        proc = await asyncio.create_subprocess_shell(cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE,
+                                                                     **PROCESS_GROUP_OPTIONS)
+                        self.process_groups.append(proc.pid)
+                        proc.stdin.close()
+                    except FileNotFoundError:
+                        debug(Debug.ERROR, "Program '{}' not found".format(cmd))
+                        self.status = TestStatus.UNKNOWN
+                        return
+                    try:
+                        await asyncio.wait_for(asyncio.gather(CappedStream.pump_async(proc.stdout, output),
+                                                              CappedStream.pump_async(proc.stderr, errors),
+                                                              proc.wait()), self.timeout)
+                        self.returncodes.append(proc.returncode)
+                    except asyncio.TimeoutError:
+                        kill_process_tree(proc)
+                        await proc.wait()
+                        self.timed_out(output)
+                        return
+                    except asyncio.CancelledError:
+                        kill_process_tree(proc)
+                        raise
+                finally:
+                    self.command_finished(index, started)
+
+            self.finish(output, errors, cache)
+        finally:
+            output.close()
+
+    def read_output(self):
+        """Stream the normalized output of this test."""
+        return self.normalizer.normalize(Test.read_normalize_chunks(self.temp_output_path))
 
     def update_status(self):
-        self.output = Test.read_normalize(self.temp_output_path)
-        self.status = TestStatus.PASSED if self.expected == self.output else TestStatus.FAILED
+        # The same comparison as pydiff's (and so lit's %diff), after normalization
+        if pydiff.chunksIdentical([self.expected or b""], self.read_output()):
+            self.status, self.output = TestStatus.PASSED, self.expected
+        else:
+            self.status, self.output = TestStatus.FAILED, b"".join(self.read_output())
 
     def report(self, tid, running, alltests):
         running = [alltests[rid].fname for rid in running]
@@ -273,33 +779,501 @@ class Test:
 
         fstring = "[{:5.2f}s] {} ({}{})"
         progress = "{}/{}".format(tid, len(alltests))
-        message = fstring.format(self.duration, wrap_color(self.name, Colors.BRIGHT),
+        message = fstring.format(self.duration or 0, wrap_color(self.name, Colors.BRIGHT),
                                  wrap_color(progress, Colors.BRIGHT), running)
 
         debug(Debug.INFO, message, headers=self.status)
+        self.emit("finished", status=self.status.name, slot=self.slot, duration=self.duration,
+                  returncodes=self.returncodes, cached=self.cached, retried=self.retried,
+                  **{col: getattr(self, col, None) for col in Test.RUSAGE_COLUMNS})
 
     @staticmethod
     def write_bytes(base_directory, relative_path, extension, contents):
         with open(os.path.join(base_directory, relative_path + extension), mode='wb') as writer:
             writer.write(contents)
 
+    RESULT_FIELDS = ["status", "start", "end", "duration", "returncodes", "proc_info", "cached", "dropped_bytes", "slot"] + RUSAGE_COLUMNS
+
+    def to_result(self):
+        """Encode the outcome of running this test as a JSON-compatible dictionary."""
+        result = {field: getattr(self, field) for field in Test.RESULT_FIELDS}
+        result["status"] = self.status.name
+        result["output"] = base64.b64encode(self.output).decode("ascii") if isinstance(self.output, bytes) else None
+        return result
+
+    @staticmethod
+    def unknown_result(slot=None):
+        """The result of a test that could not be run at all, in the format of `to_result`."""
+        result = {field: None for field in Test.RESULT_FIELDS}
+        result.update(status=TestStatus.UNKNOWN.name, returncodes=[], cached=False, dropped_bytes=0, slot=slot, output=None)
+        return result
+
+    def apply_result(self, result):
+        for field in Test.RESULT_FIELDS:
+            setattr(self, field, result[field])
+        self.status = TestStatus[result["status"]]
+        self.output = base64.b64decode(result["output"]) if result["output"] is not None else None
+
     def serialize(self, csv_writer):
-        csv_writer.writerow({col: getattr(self, col) for col in Test.COLUMNS})
+        row = {col: getattr(self, col, None) for col in Test.COLUMNS}
+        row["samples"] = json.dumps(row["samples"]) if row["samples"] else None
+        csv_writer.writerow(row)
 
     @classmethod
     def deserialize(cls, row):
         test = cls.__new__(cls)
         for col, val in row.items():
             setattr(test, col, val)
-        test.duration = float(test.duration)
         test.status = next(x for x in TestStatus if str(x) == test.status)
+        test.cached = getattr(test, "cached", None) == "True"
+        test.retried = getattr(test, "retried", None) == "True"
+        for col in ("expected_digest", "output_digest"):
+            setattr(test, col, getattr(test, col, None) or None)
+        # Tests that never ran (UNKNOWN) have no duration
+        for col in ["duration"] + Test.RUSAGE_COLUMNS + ["duration_mad", "duration_min", "timeout"]:
+            val = getattr(test, col, None)
+            setattr(test, col, float(val) if val not in (None, "", "None") else None)
+        test.samples = json.loads(test.samples) if getattr(test, "samples", None) else None
         return test
 
+class DafnyServer:
+    """A long-lived DafnyServer.exe process, used instead of Dafny.exe for plain verification RUN lines.
+
+    Each test worker owns one server.  Requests are only sent to it when the RUN
+    line is a bare '%dafny ... "%s" > "%t"' call that does not compile and does
+    not print intermediate files; everything else (and anything the server
+    can't verify to completion) falls back to a regular Dafny.exe process.  The
+    server is restarted after `max_requests` requests, or when its resident
+    memory exceeds `max_memory` megabytes.
+    """
+
+    CMD_REGEXP = re.compile(r'^(?P<dafny>.*\bDafny\.exe)\s+(?P<flags>(?:/\S+\s+)*)"(?P<source>[^"]+)"\s*>\s*"(?P<output>[^"]+)"$')
+    UNSUPPORTED_FLAGS = re.compile(r"^/(print|dprint|rprint|env|noVerify|verifySnapshots|traceCaching)")
+    # Repeated requests get cached results (the server verifies snapshots), announced by "Retrieving" lines
+    TRACE_REGEXP = re.compile(r"^\nVerifying .* \.\.\.\n(?:Retrieving cached verification result for .*\n)*"
+                              r"  \[\d+ proof obligations?\]  (?P<outcome>.*)$", re.MULTILINE)
+    LEFTOVER_TRACE_REGEXP = re.compile(r"^(Verifying .* \.\.\.|Retrieving cached verification result for .*|  \[\d+ proof obligations?\] .*)$", re.MULTILINE)
+    ERROR_REGEXP = re.compile(r"^[^ ].*\(\d+,\d+\): Error\b", re.MULTILINE)
+    TOOLTIP_REGEXP = re.compile(r"^.*\(\d+,\d+\): Info: .*\n", re.MULTILINE)
+    CLIENT_EOM = "[[DAFNY-CLIENT: EOM]]"
+    SERVER_EOM = "[[DAFNY-SERVER: EOM]]"
+
+    def __init__(self, max_requests, max_memory):
+        self.max_requests = max_requests
+        self.max_memory = max_memory
+        self.path, self.proc, self.lines = None, None, None
+        self.requests = 0
+
+    @staticmethod
+    def parse_cmd(cmd):
+        match = DafnyServer.CMD_REGEXP.match(cmd)
+        if not match:
+            return None
+        flags = match.group("flags").split()
+        if any(DafnyServer.UNSUPPORTED_FLAGS.match(flag) for flag in flags):
+            return None
+        compile_flags = [flag for flag in flags if flag.startswith("/compile:")]
+        if not compile_flags or compile_flags[-1] != "/compile:0":
+            return None
+        server_path = get_server_path(match.group("dafny"))
+        if server_path is None or not os.path.exists(server_path):
+            return None
+        return server_path, flags, match.group("source"), match.group("output")
+
+    def start(self, path):
+        debug(Debug.TRACE, "Starting {}".format(path))
+        self.path, self.requests = path, 0
+        # Nothing reads the server's stderr, which would block it once a pipe filled up
+        self.proc = Popen(path, stdin=PIPE, stdout=PIPE, stderr=DEVNULL, **PROCESS_GROUP_OPTIONS)
+        self.lines = queue.Queue()
+        threading.Thread(target=DafnyServer.pump, args=(self.proc.stdout, self.lines), daemon=True).start()
+
+    @staticmethod
+    def pump(stream, lines):
+        for line in stream:
+            lines.put(line.decode("utf-8").replace("\r\n", "\n"))
+        lines.put(None)
+
+    def stop(self, force=False):
+        if self.proc is not None:
+            try:
+                if force:
+                    raise TimeoutExpired(self.path, 0)
+                self.proc.stdin.write(b"quit\n")
+                self.proc.stdin.close()
+                self.proc.wait(timeout=5)
+            except (OSError, TimeoutExpired):
+                kill_process_tree(self.proc)
+        self.path, self.proc, self.lines = None, None, None
+
+    def memory(self):
+        """Resident set size of the server, in megabytes (None if unknown)."""
+        if psutil is not None:
+            return psutil.Process(self.proc.pid).memory_info().rss / 2**20
+        try:
+            with open("/proc/{}/status".format(self.proc.pid)) as reader:
+                for line in reader:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 2**10
+        except OSError:
+            pass
+        return None
+
+    def recycle(self, path):
+        if self.proc is not None:
+            memory = self.memory()
+            if (self.path != path or self.proc.poll() is not None or self.requests >= self.max_requests or
+                    (memory is not None and memory > self.max_memory)):
+                debug(Debug.TRACE, "Recycling {} after {} request(s)".format(self.path, self.requests))
+                self.stop()
+        if self.proc is None:
+            self.start(path)
+
+    def request(self, flags, source, timeout):
+        # The server resolves includes relative to the file name, not its own working directory
+        source = os.path.abspath(source)
+        task = {"args": flags, "filename": source, "source": source, "sourceIsFile": True}
+        payload = base64.b64encode(json.dumps(task).encode("utf-8")).decode("ascii")
+        self.proc.stdin.write("verify\n{}\n{}\n".format(payload, DafnyServer.CLIENT_EOM).encode("utf-8"))
+        self.proc.stdin.flush()
+        self.requests += 1
+
+        deadline = time() + timeout
+        response = []
+        while True:
+            try:
+                line = self.lines.get(timeout=max(0, deadline - time()))
+            except queue.Empty:
+                self.stop(force=True)
+                raise TimeoutExpired(source, timeout)
+            if line is None:
+                self.stop()
+                return None, None
+            if line.rstrip("\n").endswith(DafnyServer.SERVER_EOM):
+                return "".join(response), line.startswith("[SUCCESS]")
+            response.append(line)
+
+    @staticmethod
+    def translate(response, flags):
+        """Rewrite a server response into what Dafny.exe would have printed.
+
+        Returns None if the output can't be reproduced faithfully (for example
+        because verification stopped at resolution errors, or timed out)."""
+        outcomes = [m.group("outcome") for m in DafnyServer.TRACE_REGEXP.finditer(response)]
+        if not outcomes or any(outcome not in ("verified", "error") for outcome in outcomes):
+            return None, None
+        output = DafnyServer.TRACE_REGEXP.sub("", response).lstrip("\n")
+        if DafnyServer.LEFTOVER_TRACE_REGEXP.search(output):
+            return None, None
+        if "/printTooltips" not in flags:
+            output = DafnyServer.TOOLTIP_REGEXP.sub("", output)
+        trailer = "Verification completed successfully!\n"
+        if output.endswith(trailer):
+            output = output[:-len(trailer)]
+        verified = outcomes.count("verified")
+        errors = len(DafnyServer.ERROR_REGEXP.findall(output))
+        output += "\nDafny program verifier finished with {} verified, {} error{}\n".format(
+            verified, errors, "" if errors == 1 else "s")
+        return output, (0 if errors == 0 else 3)
+
+    def verify(self, cmd, timeout):
+        """Run `cmd` on the server if possible.
+
+        Returns the exit code that Dafny.exe would have returned, or None if
+        `cmd` must be run as a regular process."""
+        parsed = DafnyServer.parse_cmd(cmd)
+        if parsed is None:
+            return None
+        path, flags, source, output_path = parsed
+
+        self.recycle(path)
+        debug(Debug.TRACE, "Sending {} to {}".format(source, path))
+        try:
+            response, success = self.request(flags, source, timeout)
+        except OSError as e:
+            debug(Debug.WARNING, "Lost connection to {}: {}".format(path, e))
+            self.stop(force=True)
+            return None
+        if not success:
+            return None
+
+        output, returncode = DafnyServer.translate(response, flags)
+        if output is None:
+            debug(Debug.TRACE, "Falling back to Dafny.exe for {}".format(source))
+            return None
+
+        with open(output_path, mode='w', encoding="utf-8", newline='') as writer:
+            writer.write(output)
+        return returncode
+
+class BlobStore:
+    """Content-addressed directory of gzip-compressed outputs.
+
+    Blobs are named after the SHA-256 of their uncompressed contents, so each
+    distinct output is written once, however many reports refer to it.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @staticmethod
+    def digest(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest + ".gz")
+
+    def __contains__(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def write(self, digest, data):
+        path = self.path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(temp_path, mode='wb') as writer:
+            writer.write(data)
+        os.replace(temp_path, path)
+
+    def put(self, data):
+        digest = BlobStore.digest(data)
+        if digest not in self:
+            self.write(digest, gzip.compress(data))
+        return digest
+
+    def get(self, digest):
+        with gzip.open(self.path(digest)) as reader:
+            return reader.read()
+
+    def copy(self, source, digest):
+        if digest not in self and digest in source:
+            with open(source.path(digest), mode='rb') as reader:
+                self.write(digest, reader.read())
+
+class ResultCache:
+    """Content-addressed store of test results.
+
+    A result is keyed by a hash of everything that can influence it: the test
+    file and the files it (transitively) includes, the files named on its RUN
+    lines, its .expect file, the compiler binaries (including
+    DafnyPrelude.bpl), and the fully substituted commands.  Only PASSED and
+    FAILED results are stored; timeouts and errors are always re-run.
+    """
+
+    INCLUDE_REGEXP = re.compile(rb'^\s*include\s+"([^"]+)"', re.MULTILINE)
+    TOKEN_REGEXP = re.compile(r'"([^"]+)"|(\S+)')
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def hash_file(path, hasher):
+        try:
+            with open(path, mode='rb') as reader:
+                for chunk in iter(lambda: reader.read(2**20), b''):
+                    hasher.update(chunk)
+        except OSError:
+            hasher.update(b"<missing>")
+
+    @staticmethod
+    def compiler_digest(compiler):
+        """Hash the compiler and its neighbouring binaries and preludes."""
+        hasher = hashlib.sha256()
+        directory = os.path.dirname(os.path.realpath(compiler))
+        for fname in sorted(os.listdir(directory)):
+            if os.path.splitext(fname)[1].lower() in Defaults.COMPILER_EXTENSIONS:
+                hasher.update(fname.encode("utf-8"))
+                ResultCache.hash_file(os.path.join(directory, fname), hasher)
+        return hasher.hexdigest()
+
+    @staticmethod
+    def includes(path):
+        """Yield `path` and all the files that it transitively includes."""
+        seen, todo = set(), [os.path.realpath(path)]
+        while todo:
+            path = todo.pop()
+            if path in seen:
+                continue
+            seen.add(path)
+            yield path
+            try:
+                with open(path, mode='rb') as reader:
+                    contents = reader.read()
+            except OSError:
+                continue
+            directory = os.path.dirname(path)
+            for include in ResultCache.INCLUDE_REGEXP.findall(contents):
+                todo.append(os.path.realpath(os.path.join(directory, include.decode("utf-8"))))
+
+    @staticmethod
+    def inputs(test):
+        """Files read by `test`: its source, files mentioned in its commands, and their includes."""
+        roots = [test.source_path]
+        for cmd in test.cmds:
+            for quoted, bare in ResultCache.TOKEN_REGEXP.findall(cmd):
+                path = quoted or bare
+                if os.path.isfile(path) and not os.path.realpath(path).startswith(os.path.realpath(test.temp_directory)):
+                    roots.append(path)
+        return sorted(set(path for root in roots for path in ResultCache.includes(root)))
+
+    @staticmethod
+    def key(test):
+        hasher = hashlib.sha256()
+        hasher.update(str(test.compiler_digest).encode("utf-8"))
+        for cmd in test.cmds:
+            hasher.update(b"\0" + cmd.encode("utf-8"))
+        for path in ResultCache.inputs(test):
+            hasher.update(b"\0" + path.encode("utf-8") + b"\0")
+            ResultCache.hash_file(path, hasher)
+        hasher.update(b"\0" + test.normalizer.digest.encode("ascii") + b"\0")
+        hasher.update(test.expected or b"")
+        return hasher.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def restore(self, test):
+        test.cache_key = ResultCache.key(test)
+        try:
+            with open(self.entry_path(test.cache_key)) as reader:
+                entry = json.load(reader)
+        except (OSError, ValueError):
+            return False
+
+        test.status = TestStatus[entry["status"]]
+        test.returncodes = entry["returncodes"]
+        test.duration = entry["duration"]
+        test.start = time()
+        test.end = test.start + test.duration
+        test.output = base64.b64decode(entry["output"])
+        test.cached = True
+        with open(test.temp_output_path, mode='wb') as writer:
+            writer.write(test.output)
+        debug(Debug.DEBUG, "Restored {} from cache".format(test.name))
+        return True
+
+    def store(self, test):
+        if test.status not in (TestStatus.PASSED, TestStatus.FAILED):
+            return
+        entry = {"name": test.name, "status": test.status.name, "returncodes": test.returncodes,
+                 "duration": test.duration, "output": base64.b64encode(test.output).decode("ascii")}
+        path = self.entry_path(test.cache_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(temp_path, mode='w') as writer:
+            json.dump(entry, writer)
+        os.replace(temp_path, path)
+
+class ResultsDatabase:
+    """An SQLite store of test results, as an alternative to CSV reports.
+
+    Outputs live in their own table, so that queries over runs and results
+    never need to read them."""
+
+    RESULT_COLUMNS = ["status", "start_time", "end_time", "duration", "returncodes", "cached",
+                      "dropped_bytes"] + Test.RUSAGE_COLUMNS
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY, timestamp TEXT, name TEXT, compiler_hash TEXT, flags TEXT,
+            njobs INTEGER, suite_time REAL, proc_info TEXT);
+        CREATE TABLE IF NOT EXISTS tests (
+            id INTEGER PRIMARY KEY, name TEXT UNIQUE, source_path TEXT);
+        CREATE TABLE IF NOT EXISTS results (
+            id INTEGER PRIMARY KEY, run_id INTEGER REFERENCES runs(id), test_id INTEGER REFERENCES tests(id),
+            status TEXT, start_time REAL, end_time REAL, duration REAL, returncodes TEXT, cached INTEGER,
+            dropped_bytes INTEGER, user_time REAL, system_time REAL, max_rss REAL, block_input REAL,
+            block_output REAL, voluntary_switches REAL, involuntary_switches REAL);
+        CREATE TABLE IF NOT EXISTS outputs (
+            result_id INTEGER PRIMARY KEY REFERENCES results(id), expected BLOB, output BLOB);
+        CREATE INDEX IF NOT EXISTS results_by_run ON results(run_id);
+        CREATE INDEX IF NOT EXISTS results_by_test ON results(test_id, run_id);
+        CREATE INDEX IF NOT EXISTS runs_by_label ON runs(timestamp, name);
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(ResultsDatabase.SCHEMA)
+
+    def record_run(self, results, name, compiler_hash, flags):
+        with self.connection:
+            first = results[0] if results else None
+            run_id = self.connection.execute(
+                "INSERT INTO runs (timestamp, name, compiler_hash, flags, njobs, suite_time, proc_info) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (strftime("%Y-%m-%d-%H-%M-%S"), os.path.basename(name or ""), compiler_hash, flags,
+                 first and first.njobs, first and first.suite_time, first and first.proc_info)).lastrowid
+            for test in results:
+                self.connection.execute("INSERT OR IGNORE INTO tests (name, source_path) VALUES (?, ?)",
+                                        (test.name, test.source_path))
+                values = [test.status.name, test.start, test.end, test.duration, json.dumps(test.returncodes),
+                          int(bool(test.cached)), test.dropped_bytes] + [getattr(test, col) for col in Test.RUSAGE_COLUMNS]
+                result_id = self.connection.execute(
+                    "INSERT INTO results (run_id, test_id, {}) SELECT ?, id, {} FROM tests WHERE name = ?".format(
+                        ", ".join(ResultsDatabase.RESULT_COLUMNS), ", ".join("?" * len(values))),
+                    [run_id] + values + [test.name]).lastrowid
+                self.connection.execute("INSERT INTO outputs (result_id, expected, output) VALUES (?, ?, ?)",
+                                        (result_id, test.expected, test.output))
+        debug(Debug.INFO, "Recorded run {} ({} result(s))".format(run_id, len(results)))
+        return run_id
+
+    def select_runs(self, pattern):
+        """Return (id, label) pairs for the runs whose id is `pattern` or whose label matches it."""
+        return self.connection.execute(
+            "SELECT id, timestamp || '--' || name FROM runs "
+            "WHERE CAST(id AS TEXT) = ?1 OR timestamp || '--' || name GLOB ?1 ORDER BY id", (pattern,)).fetchall()
+
+    def load_run(self, run_id):
+        results = []
+        query = "SELECT tests.name, tests.source_path, runs.njobs, runs.suite_time, {} FROM results " \
+                "JOIN tests ON tests.id = results.test_id JOIN runs ON runs.id = results.run_id " \
+                "WHERE results.run_id = ?".format(", ".join("results." + col for col in ResultsDatabase.RESULT_COLUMNS))
+        for row in self.connection.execute(query, (run_id,)):
+            test = Test.__new__(Test)
+            test.name, test.source_path, test.njobs, test.suite_time = row[:4]
+            for col, val in zip(ResultsDatabase.RESULT_COLUMNS, row[4:]):
+                setattr(test, col, val)
+            test.status = TestStatus[test.status]
+            test.start, test.end = test.start_time, test.end_time
+            test.returncodes = json.loads(test.returncodes)
+            test.cached = bool(test.cached)
+            results.append(test)
+        return results
+
+    def mean_durations(self, patterns):
+        run_ids = [run_id for pattern in patterns for run_id, _ in self.select_runs(pattern)]
+        query = "SELECT tests.name, AVG(results.duration) FROM results JOIN tests ON tests.id = results.test_id " \
+                "WHERE results.status != 'UNKNOWN' AND results.run_id IN ({}) GROUP BY tests.name".format(
+                    ", ".join("?" * len(run_ids)))
+        return dict(self.connection.execute(query, run_ids).fetchall())
+
+    def duration_samples(self, patterns):
+        run_ids = [run_id for pattern in patterns for run_id, _ in self.select_runs(pattern)]
+        query = "SELECT tests.name, results.duration FROM results JOIN tests ON tests.id = results.test_id " \
+                "WHERE results.status NOT IN ('UNKNOWN', 'TIMEOUT') AND results.run_id IN ({})".format(
+                    ", ".join("?" * len(run_ids)))
+        samples = defaultdict(list)
+        for name, duration in self.connection.execute(query, run_ids):
+            samples[name].append(duration)
+        return samples
+
+def emit(event, **fields):
+    """Append a JSON record of `event` to the --events file, if any.
+
+    Each record is written with a single O_APPEND write, so records from
+    concurrent workers don't interleave."""
+    global EVENTS_FD
+    if EVENTS is None:
+        return
+    if EVENTS_FD is None:
+        EVENTS_FD = os.open(EVENTS, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    record = {"event": event, "time": time()}
+    record.update(fields)
+    os.write(EVENTS_FD, (json.dumps(record) + "\n").encode("utf-8"))
+
 def setup_parser():
     parser = argparse.ArgumentParser(description='Run the Dafny test suite.')
 
-    parser.add_argument('path', type=str, action='store', nargs='+',
-                        help='Input files or folders. Folders are searched for test files. Lists of files can also be specified by passing a .lst file (for an example of such a file, look at failing.lst after running failing tests.')
+    parser.add_argument('path', type=str, action='store', nargs='*',
+                        help='Input files or folders. Folders are searched for test files. Lists of files can also be specified by passing a .lst file (for an example of such a file, look at failing.lst after running failing tests. Required except with --worker, which gets its tests from the --serve process.')
 
     parser.add_argument('--compiler', type=str, action='append', default=None,
                         help='Dafny executable. Default: {}'.format(Defaults.DAFNY_BIN))
@@ -334,32 +1308,147 @@ def setup_parser():
     parser.add_argument('--compare', action='store_true',
                         help="Compare two previously generated reports.")
 
+    parser.add_argument('--serve', action='store', type=parse_address, default=None, metavar="HOST:PORT",
+                        help="Don't run tests; hand them out to --worker processes connecting to HOST:PORT, and write the report. Only use on trusted networks.")
+
+    parser.add_argument('--worker', action='store', type=parse_address, default=None, metavar="HOST:PORT",
+                        help="Run tests handed out by the --serve process at HOST:PORT, using -j slots. Test paths are resolved relative to the current directory.")
+
+    parser.add_argument('--db', action='store', type=str, default=None,
+                        help="SQLite database in which to record results instead of writing a CSV report. With --compare and --history, paths are then run ids or globs over '<timestamp>--<report name>' run labels.")
+
+    parser.add_argument('--merge', action='store_true',
+                        help="Merge previously generated reports (e.g. one per --shard) into a single report, named after --report.")
+
+    parser.add_argument('--shard', action='store', type=parse_shard, default=None, metavar="K/N",
+                        help="Only run the K-th of N groups of tests with roughly equal total durations (see --history).")
+
+    parser.add_argument('--adaptive-timeout', action='store', type=float, default=None, metavar="MULTIPLIER",
+                        help="Limit each test to MULTIPLIER times its 95th-percentile duration in the --history reports, within --timeout-floor and --timeout-ceiling. Tests that hit this limit are retried once with --timeout.")
+
+    parser.add_argument('--timeout-floor', action='store', type=float, default=Defaults.TIMEOUT_FLOOR,
+                        help="Lowest adaptive timeout, in seconds. Default: {}".format(Defaults.TIMEOUT_FLOOR))
+
+    parser.add_argument('--timeout-ceiling', action='store', type=float, default=None,
+                        help="Highest adaptive timeout, in seconds. Default: --timeout")
+
+    parser.add_argument('--changed-since', action='store', type=str, default=None, metavar="REV",
+                        help="Only run the tests whose source, .expect file, or included files changed since git revision REV (all tests if the compiler or its prelude changed).")
+
+    parser.add_argument('--events', action='store', type=str, default=None, metavar="FILE",
+                        help="Append a JSON record (one per line) to FILE, which may be a named pipe, for each event of the run: tests being queued, started (with their worker slot), and finished (with status, duration, and resource usage), each RUN command starting and finishing, and the suite starting and finishing.")
+
+    parser.add_argument('--dashboard', action='store', type=str, default=None, metavar="DIRECTORY",
+                        help="Don't run tests; chart previously generated reports (paths or globs) over time in DIRECTORY/index.html, a self-contained page that works offline.")
+
     parser.add_argument('--time-all', action='store_true',
                         help="When comparing, include all timings.")
 
+    parser.add_argument('--groups', action='store_true',
+                        help="When comparing, treat each path (or glob) as a group of repeated runs of one configuration, the first being the baseline, and only report statistically significant differences.")
+
+    parser.add_argument('--alpha', action='store', type=float, default=Defaults.ALPHA,
+                        help="With --groups, significance level of the Mann-Whitney test and confidence level (1 - alpha) of the bootstrap intervals. Default: {}".format(Defaults.ALPHA))
+
+    parser.add_argument('--bootstrap', action='store', type=int, default=Defaults.BOOTSTRAP_RESAMPLES,
+                        help="With --groups, number of bootstrap resamples. Default: {}".format(Defaults.BOOTSTRAP_RESAMPLES))
+
+    parser.add_argument('--metric', choices=Test.METRICS, default="duration",
+                        help="When comparing or building a dashboard, which measurement to use. Resource usage (CPU time, peak RSS in MB, block I/O, context switches) is only recorded on POSIX systems, by the pool engine. Default: duration.")
+
     parser.add_argument('--diff', '-d', action='store_true',
                         help="Don't run tests; show differences between outputs and .expect files, optionally overwritting .expect files.")
 
     parser.add_argument('--accept', '-a', action='store_true',
                         help="Don't run tests; copy outputs to .expect files.")
 
+    parser.add_argument('--batch', action='store_true',
+                        help="With --diff or --accept, diff all tests at once, in parallel, group them by identical changes, write a report (see --triage-report), and accept changes a group at a time.")
+
+    parser.add_argument('--accept-group', action='append', type=int, default=[], metavar="N",
+                        help="With --diff --batch, accept the N-th group of changes listed in the report without asking. Can be repeated.")
+
+    parser.add_argument('--triage-report', action='store', type=str, default=Defaults.TRIAGE_REPORT,
+                        help="Where --batch writes its report. Default: {}".format(Defaults.TRIAGE_REPORT))
+
     parser.add_argument('--open', '-o', action='store_true',
                         help="Don't run tests; open one file.")
 
+    parser.add_argument('--engine', choices=["pool", "async"], default=Defaults.ENGINE,
+                        help="How to run tests: 'pool' uses a pool of Python worker processes; 'async' drives all test processes from a single asyncio event loop. Default: {}".format(Defaults.ENGINE))
+
+    parser.add_argument('--history', action='append', type=str, default=[],
+                        help="Previous reports (globs accepted) from which to read test durations. Tests are then started longest-first.")
+
+    parser.add_argument('--discovery-index', action='store', type=str, default=None,
+                        help="File in which to cache the RUN specifications of test files between runs. Default: {} next to the report.".format(Defaults.DISCOVERY_INDEX))
+
+    parser.add_argument('--no-discovery-index', action='store_true',
+                        help="Read every test file's RUN specifications from scratch.")
+
+    parser.add_argument('--max-output', action='store', type=float, default=Defaults.MAX_OUTPUT / 2**20,
+                        help="Maximum size of a test's output, in megabytes. Tests that print more are reported as OVERSIZED. Default: {}".format(Defaults.MAX_OUTPUT / 2**20))
+
+    parser.add_argument('--repeat', action='store', type=int, default=1,
+                        help="Run each test this many times, in a different random order each time, and report the median duration along with all samples. Default: 1")
+
+    parser.add_argument('--warmup', action='store', type=int, default=0,
+                        help="With --repeat, first run each test this many times without recording the results. Default: 0")
+
+    parser.add_argument('--seed', action='store', type=int, default=None,
+                        help="Seed for the order of repetitions under --repeat.")
+
+    parser.add_argument('--ab', action='store_true',
+                        help="Given two --compiler options, run both versions of each test back to back in the same worker, alternating which goes first, and report paired speedups of the second compiler over the first (overall, and per test in ab.csv).")
+
+    parser.add_argument('--pin', action='store_true',
+                        help="Pin each worker process (and the tests it runs) to its own CPU. Only supported by the pool engine, on platforms with os.sched_setaffinity.")
+
+    parser.add_argument('--cache', action='store', type=str, default=None,
+                        help="Directory in which to cache test results. Tests whose inputs, expected output, compiler, and commands haven't changed are not re-run.")
+
+    parser.add_argument('--server-pool', action='store_true',
+                        help="Send plain verification RUN lines (/compile:0) to long-lived DafnyServer.exe processes instead of starting Dafny.exe for each of them. "
+                             "Each server verifies on half the CPUs, whatever its /vcsCores flag, so with several testing threads timings "
+                             "(and results that depend on timeouts) differ from those of Dafny.exe; consider a lower -j.")
+
+    parser.add_argument('--server-max-requests', action='store', type=int, default=Defaults.SERVER_MAX_REQUESTS,
+                        help='With --server-pool, restart each server after this many requests. Default: {}'.format(Defaults.SERVER_MAX_REQUESTS))
+
+    parser.add_argument('--server-max-memory', action='store', type=int, default=Defaults.SERVER_MAX_MEMORY,
+                        help='With --server-pool, restart each server once it uses more than this many megabytes. Default: {}'.format(Defaults.SERVER_MAX_MEMORY))
+
     parser.add_argument('--difftool', action='store', type=str, default="diff",
                         help='Diff program. Default: diff.')
 
     return parser
 
+def check_server_cores(args, njobs):
+    """Warn if the servers of a --server-pool run oversubscribe the CPUs."""
+    cpus = os.cpu_count() or 1
+    cores = max(1, cpus // 2) # DafnyServer overrides /vcsCores with this
+    if args.server_pool and njobs > 1 and njobs * cores > cpus:
+        debug(Debug.WARNING, "--server-pool: {} servers verifying on {} core(s) each share {} CPU(s); "
+              "timings and timeout-dependent results will differ from Dafny.exe".format(njobs, cores, cpus))
+
+def get_server(args):
+    global SERVER
+    if args.server_pool and SERVER is None:
+        SERVER = DafnyServer(args.server_max_requests, args.server_max_memory)
+    return SERVER
+
 def run_one_internal(test, test_id, args, running):
     global KILLED
     global VERBOSITY
+    global EVENTS
     VERBOSITY = args.verbosity
+    EVENTS = args.events
+    test.slot = WORKER_SLOT
 
     if not KILLED:
         try:
             running.append(test_id)
-            test.run()
+            test.run(get_server(args), ResultCache(args.cache) if args.cache else None)
         except KeyboardInterrupt:
             # There's no reliable way to handle this cleanly on Windows: if one
             # of the worker dies, it gets respawned. The reliable solution is to
@@ -373,8 +1462,120 @@ def run_one_internal(test, test_id, args, running):
 
     return test
 
-def run_one(args):
-    return run_one_internal(*args)
+def run_one_group(args):
+    group, group_id, args, running = args
+    return [run_one_internal(test, group_id, args, running) for test in group]
+
+if os.name == 'nt':
+    PROCESS_GROUP_OPTIONS = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+else:
+    PROCESS_GROUP_OPTIONS = {"start_new_session": True}
+
+def spawn(cmd):
+    """Start `cmd` in a new process group, so that it can be killed along with its children."""
+    proc = Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE, shell=True, **PROCESS_GROUP_OPTIONS)
+    PROCESSES.add(proc)
+    return proc
+
+def kill_process_tree(proc):
+    """Kill `proc` and everything it started (the shell, Dafny, and Z3)."""
+    if os.name == 'nt':
+        call(["taskkill", "/F", "/T", "/PID", str(proc.pid)], stdout=DEVNULL, stderr=DEVNULL)
+        proc.kill()
+    else:
+        # Don't use proc.kill(): it would reap proc, which Test.wait may be waiting for
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+def kill_running_processes(signum, frame):
+    for proc in list(PROCESSES):
+        kill_process_tree(proc)
+    os._exit(1)
+
+def init_pool_worker(slots, pin=False):
+    global WORKER_SLOT
+    # Pool.terminate() sends SIGTERM to workers; take the tests' processes down with them
+    if os.name != 'nt':
+        signal.signal(signal.SIGTERM, kill_running_processes)
+    WORKER_SLOT = slots.get()
+    if pin:
+        # Tests inherit the affinity of the worker that starts them; CPUs are reused if there are too few
+        cpus = sorted(os.sched_getaffinity(0))
+        cpu = cpus[WORKER_SLOT % len(cpus)]
+        os.sched_setaffinity(0, {cpu})
+        debug(Debug.DEBUG, "Worker {} pinned to CPU {}".format(os.getpid(), cpu))
+
+def worker_slots(njobs):
+    """Return a queue handing a distinct slot number to each of `njobs` pool workers."""
+    slots = multiprocessing.Queue()
+    for slot in range(njobs):
+        slots.put(slot)
+    return slots
+
+def process_info(pid):
+    """Return the name of process `pid`, whether it is a zombie, its owner's uid, and its creation time."""
+    if psutil is not None:
+        process = psutil.Process(pid)
+        return process.name(), process.status() == psutil.STATUS_ZOMBIE, process.uids().real, process.create_time()
+    with open("/proc/{}/stat".format(pid)) as reader:
+        stat = reader.read()
+    # Field 22 is the start time, in clock ticks since boot
+    fields = stat[stat.rindex(")") + 2:].split()
+    created = boot_time() + int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    return stat[stat.index("(") + 1:stat.rindex(")")], fields[0] == "Z", os.stat("/proc/{}".format(pid)).st_uid, created
+
+def boot_time():
+    with open("/proc/stat") as reader:
+        for line in reader:
+            if line.startswith("btime "):
+                return int(line.split()[1])
+    raise OSError("No boot time in /proc/stat")
+
+def process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def reap_orphans(process_groups, since):
+    """Report and kill processes left running in the process groups of finished tests.
+
+    Only processes of the current user that were created after `since` (the
+    start of the run) are candidates, and groups whose leader still exists
+    are skipped: the leaders are the tests' shells, which have all been
+    reaped, so a live process with that pid is an unrelated one that reused
+    it, and so is its group."""
+    process_groups = set(pgid for pgid in process_groups if not process_exists(pgid))
+    if os.name == 'nt' or not process_groups:
+        return
+    if psutil is not None:
+        pids = psutil.pids()
+    elif os.path.isdir("/proc"):
+        pids = [int(pid) for pid in os.listdir("/proc") if pid.isdigit()]
+    else:
+        return
+
+    orphans = []
+    for pid in pids:
+        try:
+            pgid = os.getpgid(pid)
+            if pgid in process_groups and pgid != pid:
+                name, zombie, uid, created = process_info(pid)
+                # Allow for the coarse resolution of creation times
+                if not zombie and uid == os.getuid() and created >= since - 1:
+                    orphans.append((pid, name))
+                    os.kill(pid, signal.SIGKILL)
+        except Exception:
+            continue # The process exited while we were looking at it
+
+    if orphans:
+        debug(Debug.WARNING, "Killed {} orphaned process(es) left behind by tests: {}".format(
+            len(orphans), ", ".join("{} ({})".format(name, pid) for pid, name in orphans)))
 
 def get_server_path(compiler):
     REGEXP = r"\bDafny.exe\b.*"
@@ -388,32 +1589,80 @@ def substitute_binaries(cmd, compiler):
     cmd = cmd.replace("%server", get_server_path(compiler))
     return cmd
 
-def read_one_test(fname, compiler_cmds, timeout):
-    for cid, compiler_cmd in enumerate(compiler_cmds):
-        source_path = os.path.realpath(fname)
+class DiscoveryIndex:
+    """A persistent cache of the RUN specifications of test files.
+
+    Entries are keyed by real path and invalidated when the file's mtime or size
+    changes, so only new or modified files are re-read."""
+
+    RUN_REGEXP = re.compile(r"^[/# ]*RUN: *(?!%diff)([^ ].*)$")
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path) as reader:
+                    self.entries = json.load(reader)
+            except (OSError, ValueError) as e:
+                debug(Debug.WARNING, "Ignoring unreadable discovery index {}: {}".format(path, e))
+
+    @staticmethod
+    def read_specs(source_path):
+        specs = []
         with open(source_path, mode='r') as reader:
-            cmds = []
             for line in reader:
                 line = line.strip()
-                match = re.match("^[/# ]*RUN: *(?!%diff)([^ ].*)$", line)
+                match = DiscoveryIndex.RUN_REGEXP.match(line)
                 if match:
                     debug(Debug.TRACE, "Found RUN spec: {}".format(line))
-                    cmds.append(substitute_binaries(match.groups()[0], compiler_cmd))
+                    specs.append(match.group(1))
                 else:
                     break
-        if cmds:
+        return specs
+
+    def specs(self, source_path):
+        stat = os.stat(source_path)
+        with self.lock:
+            entry = self.entries.get(source_path)
+        if entry is not None and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            return entry["specs"]
+        specs = DiscoveryIndex.read_specs(source_path)
+        with self.lock:
+            self.entries[source_path] = {"mtime": stat.st_mtime, "size": stat.st_size, "specs": specs}
+            self.dirty = True
+        return specs
+
+    def save(self):
+        if self.path is not None and self.dirty:
+            debug(Debug.DEBUG, "Saving discovery index to {}".format(self.path))
+            temp_path = self.path + ".tmp"
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(temp_path, mode='w') as writer:
+                json.dump(self.entries, writer)
+            os.replace(temp_path, self.path)
+            self.dirty = False
+
+def read_one_test(fname, compiler_cmds, timeout, index=None):
+    source_path = os.path.realpath(fname)
+    specs = index.specs(source_path) if index is not None else DiscoveryIndex.read_specs(source_path)
+    if specs:
+        for cid, compiler_cmd in enumerate(compiler_cmds):
+            cmds = [substitute_binaries(spec, compiler_cmd) for spec in specs]
             yield Test(fname, source_path, cmds, timeout, cid)
-        else:
-            debug(Debug.WARNING, "Test file {} has no RUN specification".format(fname))
+    else:
+        debug(Debug.WARNING, "Test file {} has no RUN specification".format(fname))
 
 
-def find_one(fname, compiler_cmds, timeout):
+def find_one(fname, compiler_cmds, timeout, index=None):
     _, name = os.path.split(fname)
     _, ext = os.path.splitext(name)
     if ext in Defaults.EXTENSIONS and not any(re.search(pattern, name, re.IGNORECASE) for pattern in Defaults.EXCLUDED_FILES):
         if os.path.exists(fname):
             debug(Debug.TRACE, "Found test file: {}".format(fname))
-            yield from read_one_test(fname, compiler_cmds, timeout)
+            yield from read_one_test(fname, compiler_cmds, timeout, index)
         else:
             debug(Debug.ERROR, "Test file {} not found".format(fname))
     else:
@@ -432,18 +1681,203 @@ def expand_lsts(paths):
         else:
             yield path
 
-def find_tests(paths, compiler_cmds, excluded, timeout):
-    for path in expand_lsts(paths):
-        if os.path.isdir(path):
-            debug(Debug.TRACE, "Searching for tests in {}".format(path))
-            for base, dirnames, fnames in os.walk(path):
-                dirnames[:] = [d for d in dirnames if d not in excluded]
-                for fname in fnames:
-                    yield from find_one(os.path.join(base, fname), compiler_cmds, timeout)
-        else:
-            yield from find_one(path, compiler_cmds, timeout)
-
-def run_tests(args):
+def scan_directory(path, excluded):
+    fnames, dirnames = [], []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                if entry.name not in excluded:
+                    dirnames.append(os.path.join(path, entry.name))
+            else:
+                fnames.append(os.path.join(path, entry.name))
+    return sorted(fnames), sorted(dirnames)
+
+def walk_parallel(path, excluded, executor):
+    """Yield the files under `path`, scanning directories concurrently on `executor`."""
+    pending = [executor.submit(scan_directory, path, excluded)]
+    while pending:
+        fnames, dirnames = pending.pop(0).result()
+        pending.extend(executor.submit(scan_directory, dirname, excluded) for dirname in dirnames)
+        yield from fnames
+
+def find_tests(paths, compiler_cmds, excluded, timeout, index=None):
+    with ThreadPoolExecutor(Defaults.DISCOVERY_THREADS) as executor:
+        for path in expand_lsts(paths):
+            if os.path.isdir(path):
+                debug(Debug.TRACE, "Searching for tests in {}".format(path))
+                fnames = list(walk_parallel(path, excluded, executor))
+                for tests in executor.map(lambda fname: list(find_one(fname, compiler_cmds, timeout, index)), fnames):
+                    yield from tests
+            else:
+                yield from find_one(path, compiler_cmds, timeout, index)
+
+def load_reports(pattern, db=None):
+    """Return (label, results) pairs for the reports matching `pattern`.
+
+    Without `db`, `pattern` is a glob of CSV report paths; with `db`, it is a
+    run id or a glob over '<timestamp>--<name>' run labels."""
+    if db is None:
+        return [(path, Test.load_report(path)) for path in glob(pattern)]
+    database = ResultsDatabase(db)
+    return [(label, database.load_run(run_id)) for run_id, label in database.select_runs(pattern)]
+
+def load_durations(globs, db=None):
+    """Average the durations recorded for each test in the reports matching `globs`."""
+    if db is not None:
+        return ResultsDatabase(db).mean_durations(globs)
+    samples = defaultdict(list)
+    for g in globs:
+        for _, report in load_reports(g):
+            for test in report:
+                if test.status != TestStatus.UNKNOWN and test.duration is not None:
+                    samples[test.name].append(test.duration)
+    return {name: sum(durations) / len(durations) for name, durations in samples.items()}
+
+def load_duration_samples(globs, db=None):
+    """Collect the durations of the runs of each test that completed in the reports matching `globs`."""
+    if db is not None:
+        return ResultsDatabase(db).duration_samples(globs)
+    samples = defaultdict(list)
+    for g in globs:
+        for _, report in load_reports(g):
+            for test in report:
+                if test.status not in (TestStatus.UNKNOWN, TestStatus.TIMEOUT):
+                    samples[test.name].extend(test.metric_samples("duration"))
+    return samples
+
+def percentile(values, q):
+    """Return the nearest-rank `q`-th percentile of `values`."""
+    values = sorted(values)
+    return values[max(0, ceil(q / 100 * len(values)) - 1)]
+
+def assign_adaptive_timeouts(tests, samples, args):
+    """Limit each test with enough history to a multiple of its p95 duration.
+
+    Limits are clamped between --timeout-floor and --timeout-ceiling (and
+    never exceed --timeout); other tests keep the global --timeout."""
+    ceiling = min(args.timeout_ceiling or args.timeout, args.timeout)
+    adapted = 0
+    for test in tests:
+        durations = samples.get(test.name, [])
+        if len(durations) >= Defaults.ADAPTIVE_TIMEOUT_MIN_SAMPLES:
+            limit = args.adaptive_timeout * percentile(durations, Defaults.ADAPTIVE_TIMEOUT_PERCENTILE)
+            test.timeout = max(args.timeout_floor, min(ceiling, limit))
+            adapted += 1
+    debug(Debug.INFO, "{} of {} test(s) limited to {}x their p{} duration ({:.2f}s to {:.2f}s)".format(
+        adapted, len(tests), args.adaptive_timeout, Defaults.ADAPTIVE_TIMEOUT_PERCENTILE, args.timeout_floor, ceiling))
+
+def changed_files(rev):
+    """Return the real paths of the files that differ from `rev`, including uncommitted and untracked files."""
+    try:
+        root = check_output(["git", "rev-parse", "--show-toplevel"], universal_newlines=True).strip()
+        changed = check_output(["git", "diff", "--name-only", "--no-renames", rev, "--"], cwd=root, universal_newlines=True).splitlines()
+        changed += check_output(["git", "ls-files", "--others", "--exclude-standard"], cwd=root, universal_newlines=True).splitlines()
+    except (OSError, CalledProcessError) as e:
+        debug(Debug.ERROR, "Could not list the files changed since {}: {}".format(rev, e))
+        return None
+    return set(os.path.realpath(os.path.join(root, path)) for path in changed)
+
+def compiler_changed(compiler, changed):
+    """Check whether `changed` touches the compiler's binaries, its prelude, or its sources."""
+    directory = os.path.dirname(os.path.realpath(compiler))
+    sources = os.path.realpath(os.path.join(directory, Defaults.COMPILER_SOURCES))
+    return any((os.path.dirname(path) == directory and os.path.splitext(path)[1].lower() in Defaults.COMPILER_EXTENSIONS) or
+               path.startswith(sources + os.sep) for path in changed)
+
+def select_changed(tests, rev, compilers):
+    """Keep the tests whose source, .expect file, or (transitive) inputs changed since `rev`.
+
+    All tests are kept if the compiler changed, or if git can't tell what changed."""
+    changed = changed_files(rev)
+    if changed is None:
+        debug(Debug.WARNING, "Running all tests")
+        return tests
+    if any(compiler_changed(compiler, changed) for compiler in compilers):
+        debug(Debug.INFO, "The compiler changed since {}; running all tests".format(rev))
+        return tests
+
+    dependents = defaultdict(set)
+    for test in tests:
+        for path in ResultCache.inputs(test) + [os.path.realpath(test.expect_path)]:
+            dependents[path].add(test)
+    affected = set(test for path in changed for test in dependents.get(path, ()))
+    debug(Debug.INFO, "{} file(s) changed since {}, affecting {} of {} test(s)".format(
+        len(changed), rev, len(affected), len(tests)))
+    return [test for test in tests if test in affected]
+
+def expected_durations(tests, durations):
+    """Map each test to its expected duration.
+
+    Tests with no recorded duration are assumed to take as long as the median
+    known test (or Defaults.DURATION if there is no history at all)."""
+    known = sorted(durations.values())
+    default = known[len(known) // 2] if known else Defaults.DURATION
+    debug(Debug.DEBUG, "{} of {} test(s) have no history and are assumed to take {:.2f}s".format(
+        sum(1 for test in tests if test.name not in durations), len(tests), default))
+    return {test: durations.get(test.name, default) for test in tests}
+
+def schedule_longest_first(tests, durations, njobs):
+    """Sort `tests` in place, longest expected duration first, and return the expected makespan."""
+    expected = expected_durations(tests, durations)
+    tests.sort(key=lambda test: (-expected[test], test.name, test.compiler_id))
+
+    loads = [0.0] * njobs
+    for test in tests:
+        heapq.heapreplace(loads, loads[0] + expected[test])
+    return max(loads)
+
+def parse_shard(shard):
+    match = re.match(r"^(\d+)/(\d+)$", shard)
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise argparse.ArgumentTypeError("expected K/N with 1 <= K <= N, got '{}'".format(shard))
+    return int(match.group(1)), int(match.group(2))
+
+def select_shard(tests, shard, durations):
+    """Return the tests in shard `index` of `count`.
+
+    Tests are dealt longest-first to the least loaded shard, so shards have
+    roughly equal expected durations.  The assignment only depends on the
+    test names and on `durations`, so all agents agree on it."""
+    index, count = shard
+    expected = expected_durations(tests, durations)
+    loads = [(0.0, shard_id) for shard_id in range(count)]
+    selected, selected_load = [], 0.0
+    for test in sorted(tests, key=lambda test: (-expected[test], test.name, test.compiler_id)):
+        load, shard_id = heapq.heappop(loads)
+        heapq.heappush(loads, (load + expected[test], shard_id))
+        if shard_id == index - 1:
+            selected.append(test)
+            selected_load += expected[test]
+    debug(Debug.INFO, "Shard {}/{}: {} of {} test(s), expected to take {:.2f}s in total".format(
+        index, count, len(selected), len(tests), selected_load))
+    return sorted(selected, key=operator.attrgetter("name"))
+
+def merge_reports(globs, name):
+    """Combine the reports of several shards into a single report."""
+    paths = [path for g in globs for path in glob(g)]
+    merged, suite_time, njobs = {}, 0.0, 0
+    for path in paths:
+        report = Test.load_report(path)
+        if report:
+            suite_time = max(suite_time, float(report[0].suite_time))
+            njobs += int(report[0].njobs)
+        for test in report:
+            if test.name in merged:
+                debug(Debug.WARNING, "{} appears in several reports; keeping the one from {}".format(test.name, path))
+            merged[test.name] = test
+
+    results = sorted(merged.values(), key=operator.attrgetter("name"))
+    for test in results:
+        test.suite_time, test.njobs = suite_time, njobs
+
+    debug(Debug.INFO, "Merged {} report(s)".format(len(paths)))
+    Test.summarize(results)
+    Test.build_report(results, name)
+
+def compiler_hash(args):
+    return ",".join(ResultCache.compiler_digest(compiler) for compiler in args.compiler)
+
+def check_compilers(args):
     if args.compiler is None:
         args.compiler = Defaults.COMPILER
     if args.base_flags is None:
@@ -453,46 +1887,462 @@ def run_tests(args):
         server = get_server_path(compiler)
         if not os.path.exists(compiler):
             debug(Debug.ERROR, "Compiler not found: {}".format(compiler))
-            return
+            return False
         if not os.path.exists(server):
             debug(Debug.WARNING, "Server not found")
+    return True
 
-    tests = list(find_tests(args.path, [compiler + ' ' + " ".join(args.base_flags + args.flags)
-                                        for compiler in args.compiler],
-                            args.exclude + Defaults.EXCLUDED_FOLDERS, args.timeout))
+def compiler_commands(args):
+    return [compiler + ' ' + " ".join(args.base_flags + args.flags) for compiler in args.compiler]
+
+def run_tests(args):
+    if not check_compilers(args):
+        return
+    if args.ab and len(args.compiler) != 2:
+        debug(Debug.ERROR, "--ab needs exactly two --compiler options")
+        return
+
+    index = None
+    if not args.no_discovery_index:
+        index = DiscoveryIndex(args.discovery_index or
+                               os.path.join(os.path.dirname(args.report or ""), Defaults.DISCOVERY_INDEX))
+
+    tests = list(find_tests(args.path, compiler_commands(args),
+                            args.exclude + Defaults.EXCLUDED_FOLDERS, args.timeout, index))
+    if index is not None:
+        index.save()
     tests.sort(key=operator.attrgetter("name"))
 
+    if args.changed_since:
+        tests = select_changed(tests, args.changed_since, args.compiler)
+        if not tests:
+            debug(Debug.REPORT, "No test is affected by the changes since {}".format(args.changed_since))
+            return
+
+    durations = load_durations(args.history, args.db) if args.history else {}
+    if args.shard:
+        tests = select_shard(tests, args.shard, durations)
+
     args.njobs = max(1, min(args.njobs or os.cpu_count() or 1, len(tests)))
-    debug(Debug.INFO, "\nRunning {} test(s) on {} testing thread(s), timeout is {:.2f}s, started at {}".format(len(tests), args.njobs, args.timeout, strftime("%H:%M:%S")))
 
-    try:
-        pool = Pool(args.njobs)
+    expected_makespan = None
+    if args.history:
+        expected_makespan = schedule_longest_first(tests, durations, args.njobs)
 
-        results = []
+    for test in tests:
+        test.max_output = int(args.max_output * 2**20)
+
+    if args.adaptive_timeout:
+        if not args.history:
+            debug(Debug.WARNING, "--adaptive-timeout needs --history; ignoring it")
+        elif args.serve:
+            debug(Debug.WARNING, "--adaptive-timeout is not supported with --serve; ignoring it")
+        else:
+            assign_adaptive_timeouts(tests, load_duration_samples(args.history, args.db), args)
+
+    if args.cache:
+        digests = [ResultCache.compiler_digest(compiler) for compiler in args.compiler]
+        for test in tests:
+            test.compiler_digest = digests[test.compiler_id]
+
+    if args.serve:
+        debug(Debug.INFO, "\nServing {} test(s) on {}:{}, started at {}".format(len(tests), args.serve[0], args.serve[1], strftime("%H:%M:%S")))
+    else:
+        debug(Debug.INFO, "\nRunning {} test(s) on {} testing thread(s), timeout is {:.2f}s, started at {}".format(len(tests), args.njobs, args.timeout, strftime("%H:%M:%S")))
+
+    if args.engine == "async" and args.server_pool:
+        debug(Debug.WARNING, "--server-pool is not supported by the async engine; ignoring it")
+    elif not args.serve:
+        check_server_cores(args, args.njobs)
+    if args.pin and (args.engine == "async" or not hasattr(os, "sched_setaffinity")):
+        debug(Debug.WARNING, "--pin requires the pool engine and os.sched_setaffinity; ignoring it")
+        args.pin = False
+    if args.pin and args.njobs > len(os.sched_getaffinity(0)):
+        debug(Debug.WARNING, "--pin: {} workers share {} CPU(s)".format(args.njobs, len(os.sched_getaffinity(0))))
+    if args.ab and args.engine == "async":
+        debug(Debug.WARNING, "--ab runs each pair of tests in a pool worker; ignoring --engine async")
+    if (args.repeat > 1 or args.ab) and args.cache:
+        debug(Debug.WARNING, "Cached results make no sense when benchmarking; ignoring --cache")
+        args.cache = None
+
+    emit("suite_started", tests=len(tests), njobs=args.njobs, engine=args.engine, serve=bool(args.serve))
+    for test in tests:
+        test.emit("queued", timeout=test.timeout)
+
+    try:
         start = time()
-        with Manager() as manager:
-            running = manager.list()
-            payloads = [(t, tid, args, running) for (tid, t) in enumerate(tests)]
-            for tid, test in enumerate(pool.imap_unordered(run_one, payloads, 1)):
-                test.report(tid + 1, running, tests)
-                results.append(test)
-            pool.close()
-            pool.join()
+        if args.serve:
+            results = serve_tests(tests, args)
+        elif args.repeat > 1 or args.warmup > 0:
+            results = run_benchmark(tests, args)
+        else:
+            results = run_tests_locally(tests, args)
         suite_time = time() - start
 
         for t in results:
             t.njobs = args.njobs
             t.suite_time = suite_time
 
+        reap_orphans((pgid for t in results for pgid in getattr(t, "process_groups", [])), start)
         Test.summarize(results)
-        Test.build_report(results, args.report)
+        statuses = defaultdict(int)
+        for test in results:
+            statuses[test.status.name] += 1
+        emit("suite_finished", tests=len(results), suite_time=suite_time, njobs=args.njobs, statuses=statuses)
+        if args.ab:
+            report_ab(results, args)
+        if expected_makespan is not None:
+            debug(Debug.REPORT, "Expected makespan: {:.2f}s; actual: {:.2f}s".format(expected_makespan, suite_time))
+        if args.db:
+            ResultsDatabase(args.db).record_run(results, args.report, compiler_hash(args), " ".join(args.base_flags + args.flags))
+        else:
+            Test.build_report(results, args.report)
+    except KeyboardInterrupt:
+        debug(Debug.ERROR, "Testing interrupted")
+
+def parse_address(address):
+    host, _, port = address.rpartition(":")
+    try:
+        return host or "localhost", int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected HOST:PORT, got '{}'".format(address))
+
+def send_message(wfile, message):
+    wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+    wfile.flush()
+
+class Coordinator:
+    """Hands out tests to workers, one at a time, and collects their results.
+
+    Each worker slot holds its own connection and pulls a new test whenever it
+    is idle, so fast workers naturally take more tests.  Tests whose worker
+    disconnects before reporting back are put back at the front of the queue."""
+
+    def __init__(self, tests):
+        self.tests = tests
+        self.pending = deque(range(len(tests)))
+        self.running, self.results = [], []
+        self.slots, self.peak_slots = 0, 0
+        self.condition = threading.Condition()
+
+    def finished(self):
+        return len(self.results) == len(self.tests)
+
+    def connect(self):
+        with self.condition:
+            self.slots += 1
+            self.peak_slots = max(self.peak_slots, self.slots)
+
+    def disconnect(self, tid):
+        with self.condition:
+            self.slots -= 1
+            if tid is not None:
+                debug(Debug.WARNING, "Lost worker running {}; rescheduling it".format(self.tests[tid].name))
+                self.running.remove(tid)
+                self.pending.appendleft(tid)
+                self.condition.notify_all()
+
+    def next_test(self):
+        """Return the id of the next test to run, or None once all tests are complete."""
+        with self.condition:
+            while not self.pending and not self.finished():
+                self.condition.wait()
+            if not self.pending:
+                return None
+            tid = self.pending.popleft()
+            self.running.append(tid)
+            return tid
+
+    def complete(self, tid, result, error=None):
+        with self.condition:
+            if tid not in self.running:
+                debug(Debug.WARNING, "Ignoring a result for test {}, which isn't running".format(tid))
+                return
+            test = self.tests[tid]
+            if error is not None:
+                debug(Debug.ERROR, "[{}] {}".format(test.name, error))
+            test.apply_result(result)
+            self.running.remove(tid)
+            self.results.append(test)
+            test.report(len(self.results), self.running, self.tests)
+            self.condition.notify_all()
+
+class CoordinatorHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        coordinator = self.server.coordinator
+        coordinator.connect()
+        tid = None
+        try:
+            for line in self.rfile:
+                message = json.loads(line.decode("utf-8"))
+                if message["type"] == "result" and message["id"] == tid:
+                    coordinator.complete(tid, message["result"], message.get("error"))
+                    tid = None
+                tid = coordinator.next_test()
+                if tid is None:
+                    send_message(self.wfile, {"type": "done"})
+                    break
+                test = coordinator.tests[tid]
+                send_message(self.wfile, {"type": "test", "id": tid, "name": test.name, "compiler_id": test.compiler_id})
+        except (OSError, ValueError, KeyError) as e:
+            debug(Debug.DEBUG, "Worker connection from {} failed: {}".format(self.client_address, e))
+        finally:
+            coordinator.disconnect(tid)
+
+class CoordinatorServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+def serve_tests(tests, args):
+    coordinator = Coordinator(tests)
+    server = CoordinatorServer(args.serve, CoordinatorHandler)
+    server.coordinator = coordinator
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with coordinator.condition:
+            while not coordinator.finished():
+                coordinator.condition.wait(1)
+    finally:
+        server.shutdown()
+        server.server_close()
+    args.njobs = coordinator.peak_slots
+    return coordinator.results
+
+def resolve_test(name, compiler_id, args, digests):
+    tests = list(find_one(name, compiler_commands(args), args.timeout))
+    if compiler_id >= len(tests):
+        return None
+    test = tests[compiler_id]
+    test.max_output = int(args.max_output * 2**20)
+    if digests is not None:
+        test.compiler_digest = digests[compiler_id]
+    return test
+
+def run_worker_slot(args, process_groups, slot, digests):
+    server = DafnyServer(args.server_max_requests, args.server_max_memory) if args.server_pool else None
+    cache = ResultCache(args.cache) if args.cache else None
+    try:
+        with socket.create_connection(args.worker) as sock:
+            rfile, wfile = sock.makefile("rb"), sock.makefile("wb")
+            send_message(wfile, {"type": "ready"})
+            for line in rfile:
+                message = json.loads(line.decode("utf-8"))
+                if message["type"] != "test":
+                    break
+                # Whatever goes wrong with this test, report it rather than losing the slot
+                test, error = None, None
+                try:
+                    test = resolve_test(message["name"], message["compiler_id"], args, digests)
+                    if test is None:
+                        raise LookupError("Test not found")
+                    test.slot = slot
+                    test.run(server, cache)
+                except Exception as e:
+                    error = str(e) or type(e).__name__
+                    debug(Debug.ERROR, "[{}] {}".format(message["name"], error))
+                if test is not None:
+                    process_groups.extend(test.process_groups)
+                if error is None:
+                    result = test.to_result()
+                    debug(Debug.INFO, "[{:5.2f}s] {}".format(test.duration or 0, test.name), headers=test.status)
+                else:
+                    result = Test.unknown_result(slot)
+                send_message(wfile, {"type": "result", "id": message["id"], "result": result, "error": error})
+    except OSError as e:
+        debug(Debug.ERROR, "Lost connection to {}:{}: {}".format(args.worker[0], args.worker[1], e))
+    finally:
+        if server is not None:
+            server.stop()
+
+def run_worker(args):
+    if not check_compilers(args):
+        return
+    njobs = max(1, args.njobs or os.cpu_count() or 1)
+    debug(Debug.INFO, "Running tests from {}:{} on {} testing thread(s)".format(args.worker[0], args.worker[1], njobs))
+    check_server_cores(args, njobs)
+    start, process_groups = time(), []
+    # Hashing the compiler directory is slow, so do it once rather than for each test
+    digests = [ResultCache.compiler_digest(compiler) for compiler in args.compiler] if args.cache else None
+    slots = [threading.Thread(target=run_worker_slot, args=(args, process_groups, slot, digests), daemon=True) for slot in range(njobs)]
+    for slot in slots:
+        slot.start()
+    try:
+        for slot in slots:
+            while slot.is_alive():
+                slot.join(1)
+    except KeyboardInterrupt:
+        debug(Debug.ERROR, "Worker interrupted")
+    finally:
+        for proc in list(PROCESSES):
+            kill_process_tree(proc)
+        reap_orphans(process_groups, start)
+
+def run_tests_locally(tests, args):
+    run = run_tests_ab if args.ab else run_tests_async if args.engine == "async" else run_tests_pool
+    results = run(tests, args)
+    if args.adaptive_timeout:
+        results = retry_timeouts(results, args, run)
+    return results
+
+def retry_timeouts(results, args, run):
+    """Re-run the tests that hit their adaptive timeout, this time with the global --timeout.
+
+    A test that completes on retry was a slow outlier; one that times out
+    again is most likely hung."""
+    retries = [test for test in results if test.status == TestStatus.TIMEOUT and test.timeout < args.timeout]
+    if not retries:
+        return results
+
+    debug(Debug.INFO, "\nRetrying {} test(s) that hit their adaptive timeout with a {:.2f}s timeout".format(len(retries), args.timeout))
+    for test in retries:
+        test.timeout, test.retried = args.timeout, True
+    retried = {(test.name, test.compiler_id): test for test in run(retries, args)}
+    hung = [test.name for test in retried.values() if test.status == TestStatus.TIMEOUT]
+    debug(Debug.REPORT, "{} of {} retried test(s) timed out again{}".format(
+        len(hung), len(retried), ": " + ", ".join(sorted(hung)) if hung else ""))
+    return [retried.get((test.name, test.compiler_id), test) for test in results]
+
+def run_benchmark(tests, args):
+    """Run every test `args.warmup` times, then `args.repeat` times more, keeping only the latter.
+
+    Each repetition is a round that runs every test once, in a fresh random
+    order; rounds don't overlap, since all runs of a test share its output
+    file.  Each round runs fresh copies of the tests, since some engines
+    update the tests they're given in place."""
+    rng = random.Random(args.seed)
+    runs = defaultdict(list)
+    rounds = args.warmup + max(1, args.repeat)
+    for rid in range(rounds):
+        order = [copy.copy(test) for test in tests]
+        rng.shuffle(order)
+        warmup = rid < args.warmup
+        debug(Debug.INFO, "\nRound {}/{}{}".format(rid + 1, rounds, " (warmup)" if warmup else ""))
+        start = time()
+        results = run_tests_locally(order, args)
+        reap_orphans((pgid for t in results for pgid in getattr(t, "process_groups", [])), start)
+        if not warmup:
+            for test in results:
+                runs[(test.name, test.compiler_id)].append(test)
+    return [Test.aggregate(runs[key]) for key in sorted(runs)]
+
+def run_tests_ab(tests, args):
+    """Run the two compilers' instances of each test back to back in the same worker.
+
+    Which compiler goes first alternates from one test to the next."""
+    pairs = defaultdict(dict)
+    for test in tests:
+        pairs[test.name][test.compiler_id] = test
+    pairs = [[pair[cid] for cid in (sorted(pair) if pid % 2 == 0 else sorted(pair, reverse=True))]
+             for pid, pair in enumerate(pairs.values())]
+    return run_tests_pool(tests, args, pairs)
+
+def report_ab(results, args):
+    """Report the paired speedup of the second compiler over the first, per test (in ab.csv) and overall."""
+    durations = defaultdict(dict)
+    for test in results:
+        if test.status in (TestStatus.PASSED, TestStatus.FAILED) and test.duration:
+            durations[test.name][test.compiler_id] = test.duration
+    pairs = [(name, d[0], d[1]) for name, d in sorted(durations.items()) if len(d) == 2]
+
+    with open("ab.csv", mode='w', newline='') as writer:
+        csv_writer = csv.writer(writer, dialect='excel')
+        csv_writer.writerow(["Name", args.compiler[0], args.compiler[1], "speedup"])
+        for name, a, b in pairs:
+            csv_writer.writerow([name, a, b, "{:.4f}".format(a / b)])
+
+    if not pairs:
+        debug(Debug.WARNING, "No test completed with both compilers")
+        return
+    rng = random.Random(0)
+    log_ratios = [log(b / a) for _, a, b in pairs]
+    differences = [b - a for _, a, b in pairs]
+    speedup = geometric_mean_speedup(log_ratios)
+    low, high = bootstrap_interval([log_ratios], geometric_mean_speedup, args.bootstrap, args.alpha, rng)
+    mean = lambda values: sum(values) / len(values)
+    diff_low, diff_high = bootstrap_interval([differences], mean, args.bootstrap, args.alpha, rng)
+    debug(Debug.REPORT, "\n{} vs. {} over {} paired test(s):".format(args.compiler[1], args.compiler[0], len(pairs)))
+    debug(Debug.REPORT, "  geometric mean speedup: {:.4f} ({:.0%} CI: {:.4f} - {:.4f})".format(speedup, 1 - args.alpha, low, high))
+    debug(Debug.REPORT, "  mean paired difference: {:+.3f}s ({:.0%} CI: {:+.3f}s - {:+.3f}s)".format(
+        mean(differences), 1 - args.alpha, diff_low, diff_high))
+
+def run_tests_pool(tests, args, groups=None):
+    """Run `tests` in a pool of worker processes.
+
+    Each of `groups` (lists of tests; by default, one per test) is run back to
+    back by a single worker, and counts as one step of progress."""
+    groups = groups or [[test] for test in tests]
+    firsts = [group[0] for group in groups]
+    try:
+        pool = Pool(args.njobs, initializer=init_pool_worker, initargs=(worker_slots(args.njobs), args.pin))
+
+        results = []
+        with Manager() as manager:
+            running = manager.list()
+            payloads = [(group, gid, args, running) for (gid, group) in enumerate(groups)]
+            for gid, group in enumerate(pool.imap_unordered(run_one_group, payloads, 1)):
+                for test in group:
+                    test.report(gid + 1, running, firsts)
+                results.extend(group)
+            pool.close()
+            pool.join()
+        return results
     except KeyboardInterrupt:
         try:
             pool.terminate()
             pool.join()
         except (FileNotFoundError, EOFError, ConnectionAbortedError):
             pass
-        debug(Debug.ERROR, "Testing interrupted")
+        raise
+
+async def run_one_async(test, test_id, semaphore, running, cache, slots):
+    async with semaphore:
+        try:
+            running.append(test_id)
+            test.slot = slots.pop()
+            await test.run_async(cache)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            debug(Debug.ERROR, "[{}] {}".format(test.name, e))
+            test.status = TestStatus.UNKNOWN
+        finally:
+            running.remove(test_id)
+            slots.append(test.slot)
+    return test
+
+def run_tests_async(tests, args):
+    """Run `tests` as subprocesses of this process, at most `args.njobs` at a time.
+
+    The semaphore hands out slots in FIFO order, so tests start in the order of `tests`."""
+    results = []
+    cache = ResultCache(args.cache) if args.cache else None
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(args.njobs)
+        running, slots = [], list(reversed(range(args.njobs)))
+        futures = [asyncio.ensure_future(run_one_async(t, tid, semaphore, running, cache, slots))
+                   for (tid, t) in enumerate(tests)]
+        try:
+            for tid, future in enumerate(asyncio.as_completed(futures)):
+                test = await future
+                test.report(tid + 1, running, tests)
+                results.append(test)
+        finally:
+            for future in futures:
+                future.cancel()
+            await asyncio.gather(*futures, return_exceptions=True)
+
+    loop = asyncio.ProactorEventLoop() if os.name == 'nt' else asyncio.new_event_loop()
+    main_task = asyncio.ensure_future(run_all(), loop=loop)
+    try:
+        loop.run_until_complete(main_task)
+    except KeyboardInterrupt:
+        main_task.cancel()
+        loop.run_until_complete(asyncio.gather(main_task, return_exceptions=True))
+        raise
+    finally:
+        loop.close()
+    return results
 
 
 def diff(paths, force_accept, difftool):
@@ -513,12 +2363,99 @@ def diff(paths, force_accept, difftool):
             else:
                 debug(Debug.INFO, path, "not accepted.")
 
-def compare_results(globs, time_all):
-    from glob import glob
-    paths = [path for g in globs for path in glob(g)]
-    reports = {path: Test.load_report(path) for path in paths}
-    resultsets = {path: {test.name: (test.status, test.duration) for test in report}
-                  for path, report in reports.items()}
+def diff_one(path):
+    """Diff the output of the test at `path` against its .expect file.
+
+    Returns the path, the unified diff (None if there is no output), and a
+    signature of the changed lines in which the test's own file name is
+    masked, so that tests failing the same way share a signature."""
+    test = Test(None, path, [], None)
+    if not os.path.exists(test.temp_output_path):
+        return path, None, None
+    expected = (test.expected or b"").decode("utf-8", errors="replace").splitlines(True)
+    output = b"".join(test.read_output()).decode("utf-8", errors="replace").splitlines(True)
+    lines = list(pydiff.unifiedDiff(expected, output, test.expect_path, test.temp_output_path))
+    signature = tuple(line.replace(test.fname, "%s") for line in lines[2:] if line[:1] in "+-")
+    return path, "".join(lines), signature
+
+def write_triage_report(groups, missing, path):
+    """Write an HTML page listing each group of identical failures, with its diff and its tests."""
+    def colorize(text):
+        colors = {"+": "add", "-": "del", "@": "hunk"}
+        return "".join('<span class="{}">{}</span>'.format(colors.get(line[:1], ""), html.escape(line))
+                       for line in text.splitlines(True))
+
+    with open(path, mode='w', encoding="utf-8") as writer:
+        writer.write("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Test triage</title><style>\n"
+                     "body { font-family: sans-serif; margin: 2em; } pre { background: #f4f4f4; padding: 0.5em; }\n"
+                     ".add { color: #393; } .del { color: #c33; } .hunk { color: #36c; }\n"
+                     "</style></head><body>\n<h1>Test triage</h1>\n<ol>\n")
+        for gid, members in enumerate(groups, 1):
+            writer.write('<li><a href="#group-{}">Group {}</a>: {} test(s), e.g. {}</li>\n'.format(
+                gid, gid, len(members), html.escape(members[0][0])))
+        writer.write("</ol>\n")
+        if missing:
+            writer.write("<p>No output for: {}</p>\n".format(", ".join(html.escape(p) for p in missing)))
+        for gid, members in enumerate(groups, 1):
+            writer.write('<h2 id="group-{}">Group {} ({} test(s))</h2>\n<pre>{}</pre>\n<ul>\n'.format(
+                gid, gid, len(members), colorize(members[0][1])))
+            for member, text in members:
+                writer.write("<li><details><summary>{}</summary><pre>{}</pre></details></li>\n".format(
+                    html.escape(member), colorize(text)))
+            writer.write("</ul>\n")
+        writer.write("</body></html>\n")
+
+def triage(paths, force_accept, accept_groups, njobs, report):
+    """Diff many tests at once, group them by identical changes, and accept whole groups.
+
+    Groups are numbered by decreasing size, so --accept-group can refer to
+    the numbers shown in the report.  Without --accept or --accept-group,
+    asks about each group in turn."""
+    paths = list(expand_lsts(paths))
+    for path in paths:
+        if not os.path.exists(path):
+            debug(Debug.ERROR, "Not found: {}".format(path))
+    paths = [path for path in paths if os.path.exists(path)]
+
+    with Pool(max(1, min(njobs or os.cpu_count() or 1, len(paths) or 1))) as pool:
+        diffs = pool.map(diff_one, paths)
+
+    grouped, missing, unchanged = defaultdict(list), [], 0
+    for path, text, signature in diffs:
+        if text is None:
+            missing.append(path)
+        elif not signature:
+            unchanged += 1
+        else:
+            grouped[signature].append((path, text))
+    groups = sorted(grouped.values(), key=lambda members: (-len(members), members[0][0]))
+
+    write_triage_report(groups, missing, report)
+    debug(Debug.REPORT, "{} test(s) differ from their .expect file, in {} distinct way(s); {} match; {} have no output. See {}".format(
+        sum(len(members) for members in groups), len(groups), unchanged, len(missing), report))
+
+    interactive = not force_accept and not accept_groups
+    for gid, members in enumerate(groups, 1):
+        debug(Debug.REPORT, "Group {}: {} test(s), e.g. {}".format(gid, len(members), members[0][0]))
+        accept = force_accept or gid in accept_groups
+        if interactive:
+            sys.stdout.write(members[0][1])
+            try:
+                accept = input("Accept all {} test(s) in group {}? (y/N) ".format(len(members), gid)) == "y"
+            except EOFError:
+                sys.stdout.write("\n")
+                break
+        if accept:
+            for path, _ in members:
+                test = Test(None, path, [], None)
+                shutil.copy(test.temp_output_path, test.expect_path)
+            debug(Debug.INFO, "Group {} accepted ({} test(s)).".format(gid, len(members)))
+
+def compare_results(globs, time_all, metric="duration", db=None):
+    reports = [report for g in globs for report in load_reports(g, db)]
+    paths = [path for path, _ in reports]
+    resultsets = {path: {test.name: (test.status, test.metric(metric)) for test in report}
+                  for path, report in reports}
 
     all_tests = set(name for resultset in resultsets.values() for name in resultset.keys())
 
@@ -531,7 +2468,7 @@ def compare_results(globs, time_all):
         csv_writer.writerow(["Name"] + [os.path.split(path)[1].lstrip("0123456789-") for path in paths])
 
         for name in sorted(all_tests) + ["$$TOTAL$$"]:
-            ref_status, ref_duration = reference[name]
+            ref_status, ref_duration = reference.get(name, (TestStatus.UNKNOWN, None))
 
             row = []
             row.append(name)
@@ -540,28 +2477,340 @@ def compare_results(globs, time_all):
                 res = resultsets[path].get(name)
                 test_status, test_duration = res if res else (TestStatus.UNKNOWN, None)
                 if res is not None and (test_status == ref_status or time_all):
-                    result = "{:.2%}".format((test_duration - ref_duration) / ref_duration)
+                    if test_duration is None or not ref_duration:
+                        result = "N/A"
+                    else:
+                        result = "{:.2%}".format((test_duration - ref_duration) / ref_duration)
                 else:
                     result = test_status.name + "?!"
                 row.append(result)
 
             csv_writer.writerow(row)
 
+def mann_whitney_exact(u, n1, n2):
+    """Exact two-sided p-value of U = `u` for samples of sizes `n1` and `n2` without ties."""
+    # counts[j][v]: number of arrangements of i x's and j y's with U = v, for the current i
+    counts = [[1] for _ in range(n2 + 1)]
+    for i in range(1, n1 + 1):
+        row = [[1]]
+        for j in range(1, n2 + 1):
+            left, up = row[j - 1], counts[j]
+            merged = [0] * (i * j + 1)
+            for v, count in enumerate(left):
+                merged[v] += count
+            for v, count in enumerate(up):
+                merged[v + j] += count
+            row.append(merged)
+        counts = row
+    distribution = counts[n2]
+    total = sum(distribution)
+    u = int(round(u))
+    lower, upper = sum(distribution[:u + 1]), sum(distribution[u:])
+    return min(1.0, 2 * min(lower, upper) / total)
+
+def mann_whitney(xs, ys):
+    """Two-sided p-value of the Mann-Whitney U test.
+
+    Small samples without ties use the exact distribution of U; others use the
+    normal approximation with tie correction."""
+    n1, n2 = len(xs), len(ys)
+    n = n1 + n2
+    values = sorted([(x, 0) for x in xs] + [(y, 1) for y in ys])
+    ranks, ties, i = [0.0] * n, 0, 0
+    while i < n:
+        j = i
+        while j + 1 < n and values[j + 1][0] == values[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        ties += (j - i + 1) ** 3 - (j - i + 1)
+        i = j + 1
+    u = sum(rank for rank, (_, group) in zip(ranks, values) if group == 0) - n1 * (n1 + 1) / 2
+    if ties == 0 and n <= Defaults.MANN_WHITNEY_EXACT:
+        return mann_whitney_exact(u, n1, n2)
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = max(0, abs(u - n1 * n2 / 2) - 0.5) / sqrt(variance)
+    return erfc(z / sqrt(2))
+
+def bootstrap_interval(samples, statistic, resamples, alpha, rng):
+    """Percentile bootstrap confidence interval of `statistic`, resampling each list in `samples` independently."""
+    estimates = sorted(statistic(*[[rng.choice(sample) for _ in sample] for sample in samples])
+                       for _ in range(resamples))
+    return estimates[int(alpha / 2 * (resamples - 1))], estimates[int((1 - alpha / 2) * (resamples - 1))]
+
+def benjamini_hochberg(pvalues, alpha):
+    """Largest p-value threshold that keeps the false discovery rate among `pvalues` below `alpha`."""
+    threshold = -1
+    for rank, p in enumerate(sorted(pvalues), 1):
+        if p <= rank / len(pvalues) * alpha:
+            threshold = p
+    return threshold
+
+def median_ratio(baseline, candidate):
+    return median(candidate) / median(baseline)
+
+def geometric_mean_speedup(log_ratios):
+    return exp(-sum(log_ratios) / len(log_ratios))
+
+def compare_groups(globs, metric, alpha, resamples, db=None):
+    """Compare groups of repeated reports, flagging only significant per-test changes.
+
+    For each test, the ratio of median `metric` values (candidate / baseline)
+    is reported with a bootstrap confidence interval and a Mann-Whitney
+    p-value; a change is significant if the interval excludes 1 and p passes
+    a Benjamini-Hochberg correction for testing many tests at level alpha.
+    The suite-wide speedup is the geometric mean of baseline / candidate
+    medians, with a confidence interval obtained by resampling tests."""
+    rng = random.Random(0)
+    groups = []
+    for g in globs:
+        samples = defaultdict(list)
+        reports = load_reports(g, db)
+        for _, report in reports:
+            for test in report:
+                if test.status in (TestStatus.PASSED, TestStatus.FAILED):
+                    samples[test.name].extend(test.metric_samples(metric))
+        groups.append(samples)
+        debug(Debug.INFO, "{}: {} report(s)".format(g, len(reports)))
+
+    baseline = groups[0]
+    names = sorted(set(name for samples in groups for name in samples))
+    stats = [{} for _ in globs[1:]]
+    for gid, samples in enumerate(groups[1:]):
+        for name in names:
+            ref, values = baseline.get(name, []), samples.get(name, [])
+            if len(ref) >= 2 and len(values) >= 2 and median(ref) > 0 and median(values) > 0:
+                low, high = bootstrap_interval([ref, values], median_ratio, resamples, alpha, rng)
+                stats[gid][name] = (median_ratio(ref, values), low, high, mann_whitney(ref, values))
+
+    verdicts = [defaultdict(list) for _ in globs[1:]]
+    for gid, group_stats in enumerate(stats):
+        threshold = benjamini_hochberg([p for (_, _, _, p) in group_stats.values()], alpha)
+        for name, (ratio, low, high, p) in group_stats.items():
+            verdict = "-"
+            if p <= threshold and low > 1:
+                verdict = "SLOWER"
+            elif p <= threshold and high < 1:
+                verdict = "FASTER"
+            verdicts[gid][verdict].append((name, ratio))
+            group_stats[name] += (verdict,)
+
+    with open("compare.csv", mode='w', newline='') as writer:
+        csv_writer = csv.writer(writer, dialect='excel')
+        header = ["Name", "baseline"]
+        for g in globs[1:]:
+            header += [g + " " + col for col in ("median", "ratio", "ci_low", "ci_high", "p", "verdict")]
+        csv_writer.writerow(header)
+
+        for name in names:
+            ref = baseline.get(name, [])
+            row = [name, median(ref) if ref else None]
+            for gid, samples in enumerate(groups[1:]):
+                values = samples.get(name, [])
+                row.append(median(values) if values else None)
+                if name in stats[gid]:
+                    ratio, low, high, p, verdict = stats[gid][name]
+                    row += ["{:.4f}".format(ratio), "{:.4f}".format(low), "{:.4f}".format(high), "{:.4f}".format(p), verdict]
+                else:
+                    row += [None, None, None, None, "N/A"]
+            csv_writer.writerow(row)
+
+    for gid, g in enumerate(globs[1:]):
+        debug(Debug.REPORT, "\n{} vs. {} ({}):".format(g, globs[0], metric))
+        for verdict in ("SLOWER", "FASTER"):
+            for name, ratio in sorted(verdicts[gid][verdict], key=lambda x: -abs(log(x[1]))):
+                debug(Debug.REPORT, "  {} {} ({:+.2%})".format(verdict, name, ratio - 1))
+        log_ratios = [log(ratio) for (ratio, _, _, _, _) in stats[gid].values()]
+        if log_ratios:
+            speedup = geometric_mean_speedup(log_ratios)
+            low, high = bootstrap_interval([log_ratios], geometric_mean_speedup, resamples, alpha, rng)
+            debug(Debug.REPORT, "  {} significantly slower, {} significantly faster, {} unchanged; "
+                  "geometric mean speedup: {:.4f} ({:.0%} CI: {:.4f} - {:.4f})".format(
+                      len(verdicts[gid]["SLOWER"]), len(verdicts[gid]["FASTER"]), len(verdicts[gid]["-"]),
+                      speedup, 1 - alpha, low, high))
+
+DASHBOARD_TEMPLATE = r"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Dafny test suite performance</title>
+<style>
+  body { font-family: sans-serif; margin: 2em; color: #222; }
+  h2 { margin-top: 1.5em; }
+  table { border-collapse: collapse; }
+  td, th { padding: 2px 8px; text-align: right; }
+  td:first-child, th:first-child { text-align: left; }
+  tr:nth-child(even) { background: #f4f4f4; }
+  svg text { font-size: 11px; fill: #555; }
+  .line { fill: none; stroke: #36c; stroke-width: 1.5; }
+  .bar { fill: #c33; }
+  .axis { stroke: #aaa; }
+  .slower { color: #c33; }
+  .faster { color: #393; }
+</style>
+</head>
+<body>
+<h1>Dafny test suite performance</h1>
+<p id="summary"></p>
+<h2>Suite total</h2>
+<div id="totals"></div>
+<h2>Timeouts per run</h2>
+<div id="timeouts"></div>
+<h2>Test trend</h2>
+<p><input id="test" list="tests" size="60" placeholder="Test name"><datalist id="tests"></datalist></p>
+<div id="trend"></div>
+<h2>Slowest tests (latest run)</h2>
+<div id="slowest"></div>
+<h2>Fastest-growing tests (latest run vs. first run)</h2>
+<div id="growing"></div>
+<script>
+var DATA = %DATA%;
+
+function escape(s) {
+  return String(s).replace(/[&<>"]/g, function (c) { return {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"}[c]; });
+}
+
+function scale(values, height) {
+  var max = Math.max.apply(null, values.filter(function (v) { return v !== null; }).concat([1e-9]));
+  return function (v) { return height - v / max * height; };
+}
+
+function chart(values, options) {
+  var width = options.width || 800, height = options.height || 200, pad = options.small ? 0 : 40;
+  var step = values.length > 1 ? (width - 2 * pad) / (values.length - 1) : 0;
+  var y = scale(values, height - 2 * pad);
+  var svg = '<svg width="' + width + '" height="' + height + '">';
+  if (!options.small) {
+    var max = Math.max.apply(null, values.filter(function (v) { return v !== null; }).concat([0]));
+    svg += '<line class="axis" x1="' + pad + '" y1="' + (height - pad) + '" x2="' + (width - pad) + '" y2="' + (height - pad) + '"/>';
+    svg += '<text x="0" y="' + (pad + 4) + '">' + max.toFixed(1) + options.unit + '</text>';
+    svg += '<text x="0" y="' + (height - pad) + '">0</text>';
+  }
+  var points = [];
+  values.forEach(function (v, i) {
+    var x = pad + i * step;
+    if (options.bars) {
+      if (v) svg += '<rect class="bar" x="' + (x - 3) + '" y="' + (pad + y(v)) + '" width="6" height="' + (height - 2 * pad - y(v)) + '"><title>' + escape(DATA.runs[i]) + ': ' + v + '</title></rect>';
+    } else if (v !== null) {
+      points.push(x.toFixed(1) + ',' + (pad + y(v)).toFixed(1));
+      if (!options.small) svg += '<circle cx="' + x + '" cy="' + (pad + y(v)) + '" r="3" fill="#36c"><title>' + escape(DATA.runs[i]) + ': ' + v.toFixed(2) + options.unit + '</title></circle>';
+    }
+  });
+  if (points.length) svg += '<polyline class="line" points="' + points.join(' ') + '"/>';
+  return svg + '</svg>';
+}
+
+function table(rows) {
+  var html = '<table><tr><th>Test</th><th>Latest</th><th>First</th><th>Change</th><th>Trend</th></tr>';
+  rows.forEach(function (row) {
+    var change = row.first ? (row.latest - row.first) / row.first : null;
+    var css = change === null ? '' : change > 0 ? 'slower' : 'faster';
+    html += '<tr><td><a href="#" onclick="show(\'' + escape(row.name).replace(/'/g, "\\'") + '\'); return false;">' + escape(row.name) + '</a></td>' +
+      '<td>' + row.latest.toFixed(2) + DATA.unit + '</td><td>' + (row.first === null ? '' : row.first.toFixed(2) + DATA.unit) + '</td>' +
+      '<td class="' + css + '">' + (change === null ? '' : (change * 100).toFixed(1) + '%') + '</td>' +
+      '<td>' + chart(DATA.tests[row.name], {small: true, width: 120, height: 20, unit: DATA.unit}) + '</td></tr>';
+  });
+  return html + '</table>';
+}
+
+function show(name) {
+  document.getElementById('test').value = name;
+  var values = DATA.tests[name];
+  document.getElementById('trend').innerHTML = values ? chart(values, {unit: DATA.unit}) : '';
+}
+
+document.getElementById('summary').textContent = DATA.runs.length + ' run(s), ' + Object.keys(DATA.tests).length +
+  ' test(s), from ' + DATA.runs[0] + ' to ' + DATA.runs[DATA.runs.length - 1] + '; metric: ' + DATA.metric + '.';
+document.getElementById('totals').innerHTML = chart(DATA.totals, {unit: DATA.unit});
+document.getElementById('timeouts').innerHTML = chart(DATA.timeouts.map(function (t) { return t.length; }), {bars: true, unit: ''}) +
+  '<p>Latest run: ' + (DATA.timeouts[DATA.timeouts.length - 1].map(escape).join(', ') || 'none') + '</p>';
+document.getElementById('tests').innerHTML = Object.keys(DATA.tests).sort().map(function (name) {
+  return '<option value="' + escape(name) + '">';
+}).join('');
+document.getElementById('test').addEventListener('input', function () { show(this.value); });
+document.getElementById('slowest').innerHTML = table(DATA.slowest);
+document.getElementById('growing').innerHTML = table(DATA.growing);
+if (DATA.slowest.length) show(DATA.slowest[0].name);
+</script>
+</body>
+</html>
+"""
+
+def build_dashboard(globs, directory, metric="duration", db=None):
+    """Write a self-contained HTML page charting the reports matching `globs` over time.
+
+    Runs are ordered by report name, which starts with a timestamp.  As in
+    compare_results, timeouts are left out of test trends and suite totals;
+    they are charted separately."""
+    reports = sorted((report for g in globs for report in load_reports(g, db)), key=lambda r: os.path.basename(r[0]))
+    if not reports:
+        debug(Debug.ERROR, "No reports found")
+        return
+
+    tests = defaultdict(lambda: [None] * len(reports))
+    totals, timeouts = [], []
+    for rid, (_, report) in enumerate(reports):
+        timeouts.append(sorted(test.name for test in report if test.status == TestStatus.TIMEOUT))
+        for test in report:
+            value = test.metric(metric)
+            if test.status != TestStatus.TIMEOUT and value is not None:
+                tests[test.name][rid] = round(value, 3)
+        totals.append(round(sum(values[rid] for values in tests.values() if values[rid]), 3))
+
+    summaries = []
+    for name, values in tests.items():
+        present = [v for v in values if v is not None]
+        if present:
+            summaries.append({"name": name, "latest": present[-1], "first": present[0] if len(present) > 1 else None})
+    slowest = sorted(summaries, key=lambda s: -s["latest"])
+    growing = sorted((s for s in summaries if s["first"] is not None and s["latest"] > s["first"]),
+                     key=lambda s: s["first"] - s["latest"])
+
+    data = {"runs": [os.path.splitext(os.path.basename(label))[0] for label, _ in reports],
+            "metric": metric,
+            "unit": "MB" if metric == "max_rss" else "s" if metric in ("duration", "cpu_time", "user_time", "system_time") else "",
+            "tests": tests, "totals": totals, "timeouts": timeouts,
+            "slowest": slowest[:Defaults.DASHBOARD_ROWS], "growing": growing[:Defaults.DASHBOARD_ROWS]}
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "index.html")
+    with open(path, mode='w', encoding="utf-8") as writer:
+        writer.write(DASHBOARD_TEMPLATE.replace("%DATA%", json.dumps(data).replace("</", "<\\/")))
+    debug(Debug.INFO, "Dashboard of {} run(s) written to {}".format(len(reports), path))
+
 def main():
     global VERBOSITY
+    global EVENTS
     parser = setup_parser()
     args = parser.parse_args()
+    if not args.path and not args.worker:
+        parser.error("the following arguments are required: path")
+    if args.serve and (args.repeat > 1 or args.warmup > 0):
+        parser.error("--repeat and --warmup are not supported with --serve")
     VERBOSITY = args.verbosity
+    EVENTS = args.events
 
     if os.name != 'nt' and os.environ.get("TERM") == "cygwin":
         debug(Debug.WARNING, "If you run into issues, try using Windows' Python instead of Cygwin's")
 
-    if args.diff or args.accept:
+    if (args.diff or args.accept) and (args.batch or args.accept_group):
+        triage(args.path, args.accept, args.accept_group, args.njobs, args.triage_report)
+    elif args.diff or args.accept:
         diff(args.path, args.accept, args.difftool)
     elif args.open:
         os.startfile(args.path[0])
+    elif args.worker:
+        run_worker(args)
+    elif args.merge:
+        merge_reports(args.path, args.report)
+    elif args.dashboard:
+        build_dashboard(args.path, args.dashboard, args.metric, args.db)
+    elif args.compare and args.groups:
+        compare_groups(args.path, args.metric, args.alpha, args.bootstrap, args.db)
     elif args.compare:
-        compare_results(args.path, args.time_all)
+        compare_results(args.path, args.time_all, args.metric, args.db)
     else:
         run_tests(args)
 
@@ -0,0 +1,145 @@
+"""
+Tests for runTests.py.  Run with: python -m unittest test_runTests
+"""
+import os
+import sys
+import socket
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import pydiff
+import runTests
+
+RUN_TESTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "runTests.py")
+
+FAKE_DAFNY = """#!{python}
+import os, sys
+for arg in sys.argv[1:]:
+    if arg.endswith(".dfy"):
+        print("\\nDafny program verifier finished with 1 verified, 0 errors")
+"""
+
+class FakeSuite(unittest.TestCase):
+    """A temporary test directory, with a fake Dafny.exe that verifies everything."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.compiler = os.path.join(self.root, "Binaries", "Dafny.exe")
+        os.makedirs(os.path.dirname(self.compiler))
+        with open(self.compiler, "w") as writer:
+            writer.write(FAKE_DAFNY.format(python=sys.executable))
+        os.chmod(self.compiler, 0o755)
+        self.tests = os.path.join(self.root, "Test")
+        os.makedirs(self.tests)
+
+    def add_test(self, name, run_lines):
+        path = os.path.join(self.tests, name)
+        with open(path, "w") as writer:
+            writer.write("".join("// RUN: {}\n".format(line) for line in run_lines))
+        with open(path + ".expect", "w") as writer:
+            writer.write("\nDafny program verifier finished with 1 verified, 0 errors\n")
+        return path
+
+    def run_tests(self, *args, **kwargs):
+        return subprocess.Popen([sys.executable, RUN_TESTS, "--compiler", self.compiler] + list(args),
+                                cwd=self.tests, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                universal_newlines=True, **kwargs)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@unittest.skipIf(os.name == 'nt', "The fake compiler is a Python script")
+class WorkerTests(FakeSuite):
+    def test_worker_needs_no_path(self):
+        self.add_test("a.dfy", ['%dafny "%s" > "%t"', '%diff "%s.expect" "%t"'])
+        address = "127.0.0.1:{}".format(free_port())
+        coordinator = self.run_tests("--serve", address, "--report", os.path.join(self.root, "report"), "a.dfy")
+        self.addCleanup(coordinator.kill)
+        for line in coordinator.stdout:
+            if "Serving" in line:
+                break
+        worker = self.run_tests("--worker", address)
+        self.addCleanup(worker.kill)
+        worker_output, _ = worker.communicate(timeout=60)
+        output, _ = coordinator.communicate(timeout=60)
+        self.assertEqual(worker.returncode, 0, worker_output)
+        self.assertNotIn("required", worker_output)
+        self.assertIn("[PASSED] 1 of 1", output)
+
+    def test_worker_reports_broken_tests(self):
+        path = self.add_test("a.dfy", ['%dafny "%s" > "%t"', '%diff "%s.expect" "%t"'])
+        self.add_test("b.dfy", ['%dafny "%s" > "%t"', '%diff "%s.expect" "%t"'])
+        address = "127.0.0.1:{}".format(free_port())
+        coordinator = self.run_tests("--serve", address, "--report", os.path.join(self.root, "report"), "a.dfy", "b.dfy")
+        self.addCleanup(coordinator.kill)
+        for line in coordinator.stdout:
+            if "Serving" in line:
+                break
+        # The worker can no longer build this test
+        os.remove(path + ".expect")
+        os.makedirs(path + ".expect")
+        worker = self.run_tests("--worker", address, "-j", "1")
+        self.addCleanup(worker.kill)
+        worker.communicate(timeout=60)
+        output, _ = coordinator.communicate(timeout=60)
+        self.assertIn("[UNKNOWN]", output)
+        self.assertIn("[PASSED] 1 of 2", output)
+
+        # Reports with UNKNOWN rows load, and are usable as history
+        reports = os.path.join(self.root, "*report.csv")
+        (_, report), = runTests.load_reports(reports)
+        durations = {os.path.basename(test.name): test.duration for test in report}
+        self.assertIsNone(durations["a.dfy"])
+        self.assertIsInstance(durations["b.dfy"], float)
+        self.assertEqual([os.path.basename(name) for name in runTests.load_durations([reports])], ["b.dfy"])
+
+    def test_serve_rejects_repeat(self):
+        self.add_test("a.dfy", ['%dafny "%s" > "%t"'])
+        process = self.run_tests("--serve", "127.0.0.1:{}".format(free_port()), "--repeat", "3", "a.dfy")
+        output, _ = process.communicate(timeout=60)
+        self.assertNotEqual(process.returncode, 0)
+        self.assertIn("--repeat and --warmup are not supported with --serve", output)
+
+    def test_path_required_otherwise(self):
+        output, _ = self.run_tests().communicate(timeout=60)
+        self.assertIn("the following arguments are required: path", output)
+
+class SplitRedirectTests(FakeSuite):
+    def setUp(self):
+        super(SplitRedirectTests, self).setUp()
+        path = self.add_test("a.dfy", ['%dafny "%s" > "%t"'])
+        self.test = runTests.Test("a.dfy", path, [], 60)
+        self.output = self.test.temp_output_path
+
+    def test_stdout(self):
+        self.assertEqual(self.test.split_redirect('dafny "a.dfy" > "{}"'.format(self.output)), ('dafny "a.dfy"', True))
+        self.assertEqual(self.test.split_redirect('dafny "a.dfy" >> "{}"'.format(self.output)), ('dafny "a.dfy"', False))
+        self.assertEqual(self.test.split_redirect('dafny "a.dfy">{}'.format(self.output)), ('dafny "a.dfy"', True))
+
+    def test_stderr_is_left_to_the_shell(self):
+        cmd = 'dafny "a.dfy" 2> "{}"'.format(self.output)
+        self.assertEqual(self.test.split_redirect(cmd), (cmd, False))
+        cmd = 'dafny "a.dfy" 2>> "{}"'.format(self.output)
+        self.assertEqual(self.test.split_redirect(cmd), (cmd, False))
+
+    def test_both_streams_are_left_to_the_shell(self):
+        cmd = 'dafny "a.dfy" &> "{}"'.format(self.output)
+        self.assertEqual(self.test.split_redirect(cmd), (cmd, False))
+        cmd = 'dafny "a.dfy" &>> "{}"'.format(self.output)
+        self.assertEqual(self.test.split_redirect(cmd), (cmd, False))
+
+class ComparisonTests(unittest.TestCase):
+    def test_chunk_boundaries_dont_matter(self):
+        self.assertTrue(pydiff.chunksIdentical([b"ab", b"", b"c"], [b"a", b"bc"]))
+        self.assertTrue(pydiff.chunksIdentical([], [b""]))
+        self.assertFalse(pydiff.chunksIdentical([b"ab"], [b"a", b"c"]))
+        self.assertFalse(pydiff.chunksIdentical([b"ab"], [b"abc"]))
+
+if __name__ == '__main__':
+    unittest.main()